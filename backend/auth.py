@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
+from jose import ExpiredSignatureError, JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from dependencies import get_db
+from identity_cache import identity_cache, UserSnapshot
 import crud
+import metrics
+import profiling
 
 # Security configuration
 SECRET_KEY = "your-secret-key-here"  # Change this in production
@@ -28,6 +31,10 @@ def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ):
+    with profiling.phase("auth"):
+        return _authenticate(token, db)
+
+def _authenticate(token: str, db: Session) -> UserSnapshot:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -38,13 +45,23 @@ def get_current_user(
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
-            
+
+        # Serve repeat requests for the same subject from the identity cache
+        snapshot = identity_cache.get(email)
+        if snapshot is not None:
+            return snapshot
+
         user = crud.get_user_by_email(db, email=email)
         if user is None:
             raise credentials_exception
-        return user
-    except JWTError:
+        snapshot = UserSnapshot.from_user(user)
+        identity_cache.put(email, snapshot)
+        return snapshot
+    except JWTError as e:
+        metrics.inc("jwt_decode_failures_total", (("reason", "expired" if isinstance(e, ExpiredSignatureError) else "invalid"),))
         raise credentials_exception
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,71 @@
+"""
+Measure bcrypt latency on this host and pick the cost factor for BCRYPT_ROUNDS.
+
+Usage:
+    python calibrate_hashing.py --target-ms 150 --write
+
+The chosen cost is the highest one whose median hash time stays within the
+target. With --write it is stored in the backend .env file; existing hashes
+are upgraded (or downgraded) transparently the next time each user logs in.
+"""
+from hashing import build_context
+import argparse
+import os
+import re
+import statistics
+import time
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+
+def measure_rounds(rounds: int, samples: int) -> float:
+    """Return the median hash time in milliseconds for a bcrypt cost factor"""
+    context = build_context(rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def calibrate(target_ms: float, min_rounds: int, max_rounds: int, samples: int) -> int:
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        p50 = measure_rounds(rounds, samples)
+        print(f"rounds={rounds:2d}  p50={p50:8.1f} ms")
+        if p50 > target_ms:
+            break
+        chosen = rounds
+    return chosen
+
+def write_env(rounds: int, path: str = ENV_PATH) -> None:
+    """Set BCRYPT_ROUNDS in the .env file, keeping every other line"""
+    lines = []
+    if os.path.exists(path):
+        with open(path) as f:
+            lines = f.read().splitlines()
+    setting = f"BCRYPT_ROUNDS={rounds}"
+    pattern = re.compile(r"^\s*BCRYPT_ROUNDS\s*=")
+    if any(pattern.match(line) for line in lines):
+        lines = [setting if pattern.match(line) else line for line in lines]
+    else:
+        lines.append(setting)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the bcrypt cost factor for this host")
+    parser.add_argument("--target-ms", type=float, default=150.0, help="median hash time to aim for")
+    parser.add_argument("--min-rounds", type=int, default=10)
+    parser.add_argument("--max-rounds", type=int, default=16)
+    parser.add_argument("--samples", type=int, default=5, help="hashes measured per cost factor")
+    parser.add_argument("--write", action="store_true", help=f"store the result in {ENV_PATH}")
+    args = parser.parse_args()
+
+    rounds = calibrate(args.target_ms, args.min_rounds, args.max_rounds, args.samples)
+    print(f"Selected BCRYPT_ROUNDS={rounds} for a {args.target_ms:.0f} ms target")
+    if args.write:
+        write_env(rounds)
+        print(f"Wrote BCRYPT_ROUNDS={rounds} to {ENV_PATH}")
+
+if __name__ == "__main__":
+    main()
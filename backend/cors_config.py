@@ -1,122 +1,133 @@
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Request
-from fastapi.responses import Response
-from typing import List
+from fastapi import FastAPI
+from typing import Dict, Iterable, List, Tuple
 import logging
-import json
 
-# Configure logging with more detail
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] CORS: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-logger = logging.getLogger("cors_debug")
+logger = logging.getLogger("cors")
 
-def setup_cors(app: FastAPI, allowed_origins: List[str]) -> None:
+Headers = List[Tuple[bytes, bytes]]
+
+# Define all headers we want to allow - case sensitive!
+ALLOWED_HEADERS = [
+    "Accept",
+    "Accept-Encoding",
+    "Authorization",
+    "Content-Type",
+    "DNT",
+    "Origin",
+    "User-Agent",
+    "X-Requested-With",
+    "Access-Control-Request-Method",
+    "Access-Control-Request-Headers",
+    "If-None-Match",
+    "X-Profile",
+    "X-Profile-Sample"
+]
+ALLOWED_METHODS = ["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"]
+# Response headers the frontend is allowed to read
+EXPOSED_HEADERS = ["X-Next-Cursor", "Link", "ETag", "Content-Disposition", "Server-Timing", "X-Profile-Id"]
+MAX_AGE = 3600
+
+class PrecomputedCORSMiddleware:
     """
-    Configure CORS for the FastAPI application with detailed debugging
+    Pure ASGI CORS layer. The origin set and every header block are built once
+    at startup; preflights are answered here without entering the application.
     """
-    # Define all headers we want to allow - case sensitive!
-    allowed_headers = [
-        "Accept",
-        "Accept-Encoding",
-        "Authorization",
-        "Content-Type",
-        "DNT",
-        "Origin",
-        "User-Agent",
-        "X-Requested-With",
-        "Access-Control-Request-Method",
-        "Access-Control-Request-Headers"
-    ]
 
+    def __init__(
+        self,
+        app,
+        allowed_origins: Iterable[str],
+        allowed_headers: Iterable[str] = ALLOWED_HEADERS,
+        allowed_methods: Iterable[str] = ALLOWED_METHODS,
+        exposed_headers: Iterable[str] = EXPOSED_HEADERS,
+        max_age: int = MAX_AGE,
+    ):
+        self.app = app
+        self.allowed_origins = frozenset(origin.encode("latin-1") for origin in allowed_origins)
+
+        preflight_common = [
+            (b"access-control-allow-methods", ", ".join(allowed_methods).encode("latin-1")),
+            (b"access-control-allow-headers", ", ".join(allowed_headers).encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"vary", b"Origin"),
+            (b"content-length", b"0"),
+        ]
+        simple_common = [
+            (b"access-control-allow-credentials", b"true"),
+            (b"vary", b"Origin"),
+        ]
+        exposed = ", ".join(exposed_headers)
+        if exposed:
+            simple_common.append((b"access-control-expose-headers", exposed.encode("latin-1")))
+
+        self._preflight_headers: Dict[bytes, Headers] = {
+            origin: [(b"access-control-allow-origin", origin)] + preflight_common
+            for origin in self.allowed_origins
+        }
+        self._simple_headers: Dict[bytes, Headers] = {
+            origin: [(b"access-control-allow-origin", origin)] + simple_common
+            for origin in self.allowed_origins
+        }
+        self._rejected_preflight: Headers = [(b"content-length", b"0"), (b"vary", b"Origin")]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        is_preflight = False
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                is_preflight = True
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if is_preflight and scope["method"] == "OPTIONS":
+            headers = self._preflight_headers.get(origin)
+            if headers is None:
+                logger.debug(f"Rejected CORS preflight from origin: {origin.decode('latin-1')}")
+                await self._respond(send, 400, self._rejected_preflight)
+            else:
+                await self._respond(send, 200, headers)
+            return
+
+        cors_headers = self._simple_headers.get(origin)
+        if cors_headers is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + cors_headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+    @staticmethod
+    async def _respond(send, status_code: int, headers: Headers) -> None:
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": b""})
+
+def setup_cors(app: FastAPI, allowed_origins: List[str]) -> None:
+    """
+    Configure CORS for the FastAPI application
+    """
     # Ensure the Vercel frontend origin is in the allowed origins
     if "https://personal-trainer-app-topaz.vercel.app" not in allowed_origins:
         allowed_origins.append("https://personal-trainer-app-topaz.vercel.app")
 
-    def log_cors_debug(prefix: str, data: dict) -> None:
-        """Helper to log CORS-related data in a consistent format"""
-        logger.debug(f"\n{'='*20} {prefix} {'='*20}")
-        for key, value in data.items():
-            logger.debug(f"{key}: {value}")
-        logger.debug('='*50)
-
-    @app.middleware("http")
-    async def cors_debug_middleware(request: Request, call_next):
-        # Log detailed request information
-        request_headers = dict(request.headers)
-        log_cors_debug("Incoming Request", {
-            "Method": request.method,
-            "URL": str(request.url),
-            "Origin": request_headers.get("origin", "No Origin"),
-            "Access-Control-Request-Method": request_headers.get("access-control-request-method", "None"),
-            "Access-Control-Request-Headers": request_headers.get("access-control-request-headers", "None"),
-            "All Headers": json.dumps(request_headers, indent=2)
-        })
-        
-        # Handle preflight requests with detailed logging
-        if request.method == "OPTIONS":
-            origin = request.headers.get("origin", "").strip()
-            requested_method = request.headers.get("access-control-request-method")
-            requested_headers = request.headers.get("access-control-request-headers")
-            
-            log_cors_debug("Preflight Details", {
-                "Origin Allowed": origin in allowed_origins,
-                "Requested Method": requested_method,
-                "Requested Headers": requested_headers,
-                "Allowed Headers": ", ".join(allowed_headers)
-            })
-
-            if origin in allowed_origins:
-                headers = {
-                    "Access-Control-Allow-Origin": origin,
-                    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS, PATCH",
-                    "Access-Control-Allow-Headers": ", ".join(allowed_headers),
-                    "Access-Control-Allow-Credentials": "true",
-                    "Access-Control-Max-Age": "3600",
-                    "Vary": "Origin"
-                }
-                
-                log_cors_debug("Preflight Response", {
-                    "Status": "204 No Content",
-                    "Headers": json.dumps(headers, indent=2)
-                })
-                return Response(status_code=204, headers=headers)
-            
-            log_cors_debug("Preflight Rejected", {
-                "Reason": "Origin not allowed",
-                "Requested Origin": origin,
-                "Allowed Origins": allowed_origins
-            })
-            return Response(status_code=204)
-        
-        # Handle actual request
-        response = await call_next(request)
-        
-        # Add CORS headers to all responses
-        origin = request.headers.get("origin", "").strip()
-        if origin in allowed_origins:
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            response.headers["Access-Control-Allow-Headers"] = ", ".join(allowed_headers)
-            response.headers["Vary"] = "Origin"
-        
-        # Log response details
-        log_cors_debug("Response", {
-            "Status": response.status_code,
-            "Headers": json.dumps(dict(response.headers), indent=2)
-        })
-        
-        return response
-
-    # Add the CORS middleware
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=allowed_origins,
-        allow_credentials=True,
-        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-        allow_headers=allowed_headers,
-        expose_headers=["*"],
-        max_age=3600,
-    ) 
\ No newline at end of file
+    # Wrap the fully built middleware stack rather than using add_middleware:
+    # that keeps CORS outside ServerErrorMiddleware, so unhandled 500s carry
+    # the same headers and no handler has to patch them in.
+    build_middleware_stack = app.build_middleware_stack
+
+    def build_middleware_stack_with_cors():
+        return PrecomputedCORSMiddleware(build_middleware_stack(), allowed_origins)
+
+    app.build_middleware_stack = build_middleware_stack_with_cors
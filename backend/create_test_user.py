@@ -1,6 +1,24 @@
-from database import SessionLocal
+"""
+Create the test user, or import client accounts from a CSV or NDJSON file.
+
+Usage:
+    python create_test_user.py
+    python create_test_user.py --import clients.csv --admin coach@example.com
+
+CSV files need a header with email, full_name and password columns; NDJSON
+files hold one object with those keys per line. Imported users are assigned
+to the --admin account when one is given.
+"""
+from database import SessionLocal, AsyncSessionLocal, async_engine
+import argparse
+import asyncio
+import sys
 import crud
+import hashing
 import schemas
+import user_import
+
+READ_CHUNK_BYTES = 64 * 1024
 
 def create_test_user():
     db = SessionLocal()
@@ -26,5 +44,56 @@ def create_test_user():
     finally:
         db.close()
 
+async def _read_chunks(path: str):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(READ_CHUNK_BYTES)
+            if not chunk:
+                return
+            yield chunk
+
+async def _import_file(path: str, import_format: str, admin_email: str, batch_size: int) -> dict:
+    try:
+        async with AsyncSessionLocal() as db:
+            admin = None
+            if admin_email:
+                admin = await crud.get_user_by_email_async(db, email=admin_email)
+                if admin is None or not admin.is_admin:
+                    raise SystemExit(f"No admin account with email {admin_email}")
+            importer = user_import.UserImporter(db, admin=admin, batch_size=batch_size)
+            return await importer.run(user_import.iter_lines(_read_chunks(path)), import_format)
+    finally:
+        await async_engine.dispose()
+
+def import_users(path: str, import_format: str = None, admin_email: str = None,
+                 batch_size: int = user_import.IMPORT_BATCH_SIZE) -> int:
+    """Import users from a file and print the report; returns the process exit code"""
+    import_format = import_format or user_import.format_from_filename(path)
+    if import_format is None:
+        print("Cannot tell the file format from its name; pass --format csv|ndjson")
+        return 2
+    try:
+        report = asyncio.run(_import_file(path, import_format, admin_email, batch_size))
+    finally:
+        hashing.shutdown_executor()
+
+    for error in report["errors"]:
+        email = f" ({error['email']})" if error["email"] else ""
+        print(f"line {error['line']}{email}: {error['error']}")
+    if report["failed"] > len(report["errors"]):
+        print(f"... {report['failed'] - len(report['errors'])} more errors not listed")
+    if report["aborted"]:
+        print(f"Import stopped early: {report['aborted']}")
+    print(f"Created {report['created']} of {report['rows']} users, {report['failed']} failed")
+    return 1 if report["failed"] or report["aborted"] else 0
+
 if __name__ == "__main__":
-    create_test_user() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--import", dest="import_path", help="CSV or NDJSON file of users to create")
+    parser.add_argument("--format", choices=user_import.IMPORT_FORMATS, help="defaults to the file extension")
+    parser.add_argument("--admin", help="email of the admin to assign imported users to")
+    parser.add_argument("--batch-size", type=int, default=user_import.IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    if args.import_path:
+        sys.exit(import_users(args.import_path, args.format, args.admin, args.batch_size))
+    create_test_user()
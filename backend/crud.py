@@ -1,17 +1,42 @@
+from sqlalchemy import and_, case, func, insert, or_, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
 import models, schemas
-from datetime import datetime
-import json
-from passlib.context import CryptContext
-from typing import List
+from datetime import date, datetime, time, timezone
+from typing import Any, Collection, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
+from identity_cache import identity_cache
+from response_cache import response_cache
+from hashing import pwd_context, verify_password, get_password_hash
+import hashing
+from pagination import Page, after_cursor, decode_cursor, encode_cursor, invalid_cursor, keyset_paginate
+from recurrence import Occurrence, expand_templates, format_weekdays
+from training_volume import apply_volume_deltas, exercise_key, volume_deltas, week_start
+import logging
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Stable orderings used for cursor pagination of plan lists
+WORKOUT_PLAN_ORDER = [models.WorkoutPlan.scheduled_date, models.WorkoutPlan.id]
+MEAL_PLAN_ORDER = [models.MealPlan.scheduled_date, models.MealPlan.id]
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def to_naive_utc(value: Union[datetime, date, None]) -> Optional[datetime]:
+    """Plan dates are stored as naive UTC; normalize dates and aware datetimes to match"""
+    if value is None:
+        return None
+    if not isinstance(value, datetime):
+        return datetime.combine(value, time.min)
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def filter_scheduled_window(query, column, date_from: Union[datetime, date, None], date_to: Union[datetime, date, None]):
+    """Restrict a plan query to date_from <= scheduled_date < date_to"""
+    if date_from is not None:
+        query = query.filter(column >= to_naive_utc(date_from))
+    if date_to is not None:
+        query = query.filter(column < to_naive_utc(date_to))
+    return query
 
 def get_user(db: Session, user_id: int):
     """Get a user by ID with relationships loaded"""
@@ -27,51 +52,50 @@ def get_user_by_email(db: Session, email: str):
         ).filter(models.User.email == email).first()
         
         if user:
-            print(f"Found user: id={user.id}, email={user.email}, is_admin={user.is_admin}")
+            logger.debug(f"Found user: id={user.id}, email={user.email}, is_admin={user.is_admin}")
         else:
-            print(f"No user found with email: {email}")
+            logger.debug(f"No user found with email: {email}")
         
         return user
     except Exception as e:
-        print(f"Error in get_user_by_email: {str(e)}")
+        logger.error(f"Error in get_user_by_email: {str(e)}")
         raise
 
-def get_users(db: Session, skip: int = 0, limit: int = 100, admin_id: int = None):
-    """Get users with optional filtering by admin assignment"""
-    query = db.query(models.User).filter(models.User.is_admin == False)
-    
+def get_users(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    admin_id: int = None,
+    cursor: Optional[str] = None
+) -> Page:
+    """Get a page of non-admin users, or of an admin's assigned users when admin_id is given"""
+    query = db.query(models.User)
     if admin_id:
-        admin = db.query(models.User).filter(models.User.id == admin_id).first()
-        if admin and admin.is_admin:
-            return admin.assigned_users[skip:skip + limit]
-    
-    return query.offset(skip).limit(limit).all()
+        # Ordering by the association's user_id lets the page come straight
+        # off the (admin_id, user_id) primary key without a sort
+        association = models.admin_user_association
+        query = query.join(
+            association,
+            association.c.user_id == models.User.id
+        ).filter(association.c.admin_id == admin_id)
+        return keyset_paginate(query, [association.c.user_id], limit, cursor=cursor, skip=skip, row_keys=["id"])
 
-def get_admin_users(db: Session, admin_id: int):
-    """Get all users assigned to a specific admin"""
-    try:
-        # Get admin with assigned_users relationship loaded
-        admin = db.query(models.User).options(
-            joinedload(models.User.assigned_users)
-        ).filter(
-            models.User.id == admin_id,
-            models.User.is_admin == True
-        ).first()
-        
-        if not admin:
-            print(f"Admin not found or user is not an admin: admin_id={admin_id}")
-            return []
-        
-        # Return assigned users or empty list
-        assigned_users = admin.assigned_users
-        print(f"Found {len(assigned_users)} assigned users for admin {admin_id}")
-        return assigned_users
-    except Exception as e:
-        print(f"Error in get_admin_users: {str(e)}")
-        raise
+    query = query.filter(models.User.is_admin == False)
+    return keyset_paginate(query, [models.User.id], limit, cursor=cursor, skip=skip)
+
+def get_admin_users(
+    db: Session,
+    admin_id: int,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Page:
+    """Get a page of the users assigned to a specific admin (all of them when limit is None)"""
+    return get_users(db, limit=limit, admin_id=admin_id, cursor=cursor)
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    """Create a user, hashing the password here unless a hash is supplied"""
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         hashed_password=hashed_password,
@@ -81,152 +105,741 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    identity_cache.invalidate(db_user.email)
     return db_user
 
-def assign_user_to_admin(db: Session, admin_id: int, user_id: int):
-    """Assign a user to an admin"""
+def _assignment_insert(dialect_name: str):
+    """INSERT into admin_users that skips pairs which are already assigned"""
+    table = models.admin_user_association
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    return dialect_insert(table).on_conflict_do_nothing(
+        index_elements=[table.c.admin_id, table.c.user_id]
+    )
+
+def assign_users_to_admin(db: Session, admin_id: int, user_ids: Collection[int]) -> Optional[Set[int]]:
+    """
+    Assign users to an admin with a single INSERT ... ON CONFLICT DO NOTHING.
+
+    Returns the ids this call newly assigned, or None if admin_id is not an
+    admin. The caller checks that the users exist.
+    """
     try:
-        # Get admin with assigned_users relationship loaded
-        admin = db.query(models.User).options(
-            joinedload(models.User.assigned_users)
-        ).filter(models.User.id == admin_id).first()
-        
-        # Get user
-        user = db.query(models.User).filter(models.User.id == user_id).first()
-        
-        if not admin or not user:
-            print(f"Admin or user not found: admin_id={admin_id}, user_id={user_id}")
+        admin = db.get(models.User, admin_id)
+        if not admin or not admin.is_admin:
+            logger.debug(f"User {admin_id} is not an admin")
             return None
-        
-        if not admin.is_admin:
-            print(f"User {admin_id} is not an admin")
-            return None
-        
-        # Check if the relationship already exists
-        if user not in admin.assigned_users:
-            admin.assigned_users.append(user)
-            db.commit()
-            db.refresh(admin)  # Refresh to get updated relationships
-            print(f"Successfully assigned user {user_id} to admin {admin_id}")
-        else:
-            print(f"User {user_id} is already assigned to admin {admin_id}")
-        
-        return user
+
+        ids = set(user_ids)
+        association = models.admin_user_association
+        already_assigned = set(db.execute(
+            select(association.c.user_id).where(
+                association.c.admin_id == admin_id,
+                association.c.user_id.in_(ids)
+            )
+        ).scalars())
+        new_ids = ids - already_assigned
+        if not new_ids:
+            logger.debug(f"Users {sorted(ids)} are already assigned to admin {admin_id}")
+            return set()
+
+        # A concurrent assignment of the same pair is skipped rather than duplicated
+        db.execute(
+            _assignment_insert(db.get_bind().dialect.name),
+            [{"admin_id": admin_id, "user_id": user_id} for user_id in sorted(new_ids)]
+        )
+        db.commit()
+        identity_cache.invalidate(admin.email)
+        logger.info(f"Assigned {len(new_ids)} users to admin {admin_id}")
+        return new_ids
     except Exception as e:
-        print(f"Error assigning user to admin: {str(e)}")
+        logger.error(f"Error assigning users to admin: {str(e)}")
         db.rollback()
         raise
 
-def get_workout_plans(db: Session, skip: int = 0, limit: int = 100):
-    """Get all workout plans with deserialized exercises"""
+def assign_user_to_admin(db: Session, admin_id: int, user_id: int):
+    """Assign a user to an admin"""
+    user = db.get(models.User, user_id)
+    if not user:
+        logger.debug(f"User not found: user_id={user_id}")
+        return None
+    if assign_users_to_admin(db, admin_id, [user_id]) is None:
+        return None
+    return user
+
+def plan_version_bump(user_ids: Iterable[int]):
+    """UPDATE moving each user's plan feed to a new version; run it in the writing transaction"""
+    users = models.User.__table__
+    return update(users).where(users.c.id.in_(set(user_ids))).values(
+        plan_version=func.coalesce(users.c.plan_version, 0) + 1
+    )
+
+def invalidate_plan_feeds(user_ids: Iterable[int]) -> None:
+    """Drop cached plan feed responses for users whose plans just changed"""
+    for user_id in set(user_ids):
+        response_cache.invalidate_user(user_id)
+
+def get_plan_version(db: Session, user_id: int) -> int:
+    """Current plan feed version for a user; a primary key lookup on users only"""
+    return db.execute(select(models.User.plan_version).where(models.User.id == user_id)).scalar() or 0
+
+def build_workout_exercises(exercises: List[schemas.Exercise]) -> List[models.WorkoutExercise]:
+    """Build ordered exercise rows for a workout plan"""
+    return [
+        models.WorkoutExercise(
+            position=position,
+            name=exercise.name,
+            sets=exercise.sets,
+            reps=exercise.reps,
+            weight=exercise.weight
+        ) for position, exercise in enumerate(exercises)
+    ]
+
+def build_plan_meals(meals: List[schemas.Meal]) -> List[models.PlanMeal]:
+    """Build ordered meal rows for a meal plan"""
+    return [
+        models.PlanMeal(
+            position=position,
+            name=meal.name,
+            time=meal.time,
+            calories=meal.calories,
+            protein=meal.protein,
+            carbs=meal.carbs,
+            fats=meal.fats,
+            ingredients=meal.ingredients
+        ) for position, meal in enumerate(meals)
+    ]
+
+def get_workout_plans(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> Page:
+    """Get a page of all workout plans"""
     try:
-        workout_plans = db.query(models.WorkoutPlan).offset(skip).limit(limit).all()
-        # Deserialize exercises for each workout plan
-        for workout_plan in workout_plans:
-            if workout_plan.exercises:
-                workout_plan.exercises = json.loads(workout_plan.exercises)
-        return workout_plans
+        query = db.query(models.WorkoutPlan)
+        query = filter_scheduled_window(query, models.WorkoutPlan.scheduled_date, date_from, date_to)
+        return keyset_paginate(query, WORKOUT_PLAN_ORDER, limit, cursor=cursor, skip=skip)
     except Exception as e:
-        print(f"Error getting workout plans: {str(e)}")
+        logger.error(f"Error getting workout plans: {str(e)}")
         raise
 
-def get_user_workout_plans(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    """Get workout plans for a specific user with deserialized exercises"""
+def get_user_workout_plans(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> Page:
+    """Get a page of workout plans for a specific user"""
     try:
-        workout_plans = db.query(models.WorkoutPlan).filter(
+        query = db.query(models.WorkoutPlan).filter(
             models.WorkoutPlan.user_id == user_id
-        ).offset(skip).limit(limit).all()
-        
-        # Deserialize exercises for each workout plan
-        for workout_plan in workout_plans:
-            if workout_plan.exercises:
-                workout_plan.exercises = json.loads(workout_plan.exercises)
-        return workout_plans
+        )
+        query = filter_scheduled_window(query, models.WorkoutPlan.scheduled_date, date_from, date_to)
+        return keyset_paginate(query, WORKOUT_PLAN_ORDER, limit, cursor=cursor, skip=skip)
     except Exception as e:
-        print(f"Error getting user workout plans: {str(e)}")
+        logger.error(f"Error getting user workout plans: {str(e)}")
         raise
 
 def create_workout_plan(db: Session, workout_plan: schemas.WorkoutPlanCreate):
     """Create a new workout plan"""
     try:
-        # Create the workout plan model
+        # Create the workout plan model with its exercise rows
         db_workout_plan = models.WorkoutPlan(
             title=workout_plan.title,
             description=workout_plan.description,
-            exercises=workout_plan.serialize_exercises(),  # Serialize exercises to JSON string
+            exercises_json=workout_plan.serialize_exercises(),
+            exercises=build_workout_exercises(workout_plan.exercises),
             user_id=workout_plan.assigned_user_id,  # Use assigned_user_id directly
-            scheduled_date=workout_plan.scheduled_date
+            scheduled_date=to_naive_utc(workout_plan.scheduled_date),
+            template_id=workout_plan.template_id,
+            occurrence_date=to_naive_utc(workout_plan.occurrence_date)
         )
         
-        # Add and commit to database
+        # Add and commit to database, moving the user's plan feed to a new version
         db.add(db_workout_plan)
+        apply_volume_deltas(db, volume_deltas([
+            (workout_plan.assigned_user_id, db_workout_plan.scheduled_date, workout_plan.exercises)
+        ]))
+        db.execute(plan_version_bump([workout_plan.assigned_user_id]))
         db.commit()
+        invalidate_plan_feeds([workout_plan.assigned_user_id])
         db.refresh(db_workout_plan)
-        
-        # Deserialize exercises before returning
-        if db_workout_plan.exercises:
-            db_workout_plan.exercises = json.loads(db_workout_plan.exercises)
         return db_workout_plan
     except Exception as e:
-        print(f"Error creating workout plan: {str(e)}")
+        logger.error(f"Error creating workout plan: {str(e)}")
         db.rollback()
         raise e
 
-def get_meal_plans(db: Session, skip: int = 0, limit: int = 100):
-    """Get all meal plans with deserialized meals"""
+def get_meal_plans(
+    db: Session,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> Page:
+    """Get a page of all meal plans"""
     try:
-        meal_plans = db.query(models.MealPlan).offset(skip).limit(limit).all()
-        # Deserialize meals for each meal plan
-        for meal_plan in meal_plans:
-            if meal_plan.meals:
-                meal_plan.meals = json.loads(meal_plan.meals)
-        return meal_plans
+        query = db.query(models.MealPlan)
+        query = filter_scheduled_window(query, models.MealPlan.scheduled_date, date_from, date_to)
+        return keyset_paginate(query, MEAL_PLAN_ORDER, limit, cursor=cursor, skip=skip)
     except Exception as e:
-        print(f"Error getting meal plans: {str(e)}")
+        logger.error(f"Error getting meal plans: {str(e)}")
         raise
 
-def get_user_meal_plans(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    """Get meal plans for a specific user with deserialized meals"""
+def get_user_meal_plans(
+    db: Session,
+    user_id: int,
+    skip: int = 0,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> Page:
+    """Get a page of meal plans for a specific user"""
     try:
-        meal_plans = db.query(models.MealPlan).filter(
+        query = db.query(models.MealPlan).filter(
             models.MealPlan.user_id == user_id
-        ).offset(skip).limit(limit).all()
-        
-        # Deserialize meals for each meal plan
-        for meal_plan in meal_plans:
-            if meal_plan.meals:
-                meal_plan.meals = json.loads(meal_plan.meals)
-        return meal_plans
+        )
+        query = filter_scheduled_window(query, models.MealPlan.scheduled_date, date_from, date_to)
+        return keyset_paginate(query, MEAL_PLAN_ORDER, limit, cursor=cursor, skip=skip)
     except Exception as e:
-        print(f"Error getting user meal plans: {str(e)}")
+        logger.error(f"Error getting user meal plans: {str(e)}")
         raise
 
 def create_meal_plan(db: Session, meal_plan: schemas.MealPlanCreate):
     """Create a new meal plan"""
     try:
-        # Create the meal plan model
+        # Create the meal plan model with its meal rows
         db_meal_plan = models.MealPlan(
             title=meal_plan.title,
             description=meal_plan.description,
-            scheduled_date=meal_plan.scheduled_date,
-            meals=meal_plan.serialize_meals(),  # Use the serialize_meals method
-            user_id=meal_plan.user_id
+            scheduled_date=to_naive_utc(meal_plan.scheduled_date),
+            meals_json=meal_plan.serialize_meals(),
+            meals=build_plan_meals(meal_plan.meals),
+            user_id=meal_plan.user_id,
+            template_id=meal_plan.template_id,
+            occurrence_date=to_naive_utc(meal_plan.occurrence_date)
         )
         
-        # Add and commit to database
+        # Add and commit to database, moving the user's plan feed to a new version
         db.add(db_meal_plan)
+        db.execute(plan_version_bump([meal_plan.user_id]))
         db.commit()
+        invalidate_plan_feeds([meal_plan.user_id])
         db.refresh(db_meal_plan)
         return db_meal_plan
     except Exception as e:
-        print(f"Error creating meal plan: {str(e)}")
+        logger.error(f"Error creating meal plan: {str(e)}")
         db.rollback()
         raise e
 
+def get_existing_user_ids(db: Session, user_ids: Iterable[int]) -> Set[int]:
+    """Return the subset of user_ids that exist, in one query"""
+    ids = set(user_ids)
+    if not ids:
+        return set()
+    return set(db.execute(select(models.User.id).where(models.User.id.in_(ids))).scalars())
+
+def _insert_plans(db: Session, table, rows: List[dict]) -> List[int]:
+    """
+    Insert plan rows and return their ids in order.
+
+    On PostgreSQL the ids are reserved from the table's sequence in a single
+    round trip so the rows themselves go out as one executemany. SQLite has
+    no sequence, so the first row is inserted alone: that takes the database
+    write lock and yields the highest id in the table, and the ids after it
+    stay free until commit, so the remaining rows take them in one
+    executemany.
+    """
+    if not rows:
+        return []
+    if db.bind.dialect.name == "postgresql":
+        ids = list(db.execute(
+            text("SELECT nextval(pg_get_serial_sequence(:table_name, 'id')) FROM generate_series(1, :count)"),
+            {"table_name": table.name, "count": len(rows)}
+        ).scalars())
+        db.execute(insert(table), [dict(row, id=plan_id) for row, plan_id in zip(rows, ids)])
+        return ids
+    first_id = db.execute(insert(table), rows[0]).inserted_primary_key[0]
+    ids = list(range(first_id, first_id + len(rows)))
+    if len(rows) > 1:
+        db.execute(insert(table), [dict(row, id=plan_id) for row, plan_id in zip(rows[1:], ids[1:])])
+    return ids
+
+def create_workout_plans_bulk(db: Session, workout_plans: List[schemas.WorkoutPlanCreate]) -> List[int]:
+    """Create many workout plans in one transaction and return their ids"""
+    try:
+        now = datetime.utcnow()
+        ids = _insert_plans(db, models.WorkoutPlan.__table__, [
+            {
+                "title": plan.title,
+                "description": plan.description,
+                "exercises": plan.serialize_exercises(),
+                "user_id": plan.assigned_user_id,
+                "scheduled_date": to_naive_utc(plan.scheduled_date),
+                "template_id": plan.template_id,
+                "occurrence_date": to_naive_utc(plan.occurrence_date),
+                "created_at": now,
+            } for plan in workout_plans
+        ])
+        exercise_rows = [
+            {"plan_id": plan_id, "position": position, **exercise.dict()}
+            for plan_id, plan in zip(ids, workout_plans)
+            for position, exercise in enumerate(plan.exercises)
+        ]
+        if exercise_rows:
+            db.execute(insert(models.WorkoutExercise.__table__), exercise_rows)
+        apply_volume_deltas(db, volume_deltas(
+            (plan.assigned_user_id, to_naive_utc(plan.scheduled_date), plan.exercises) for plan in workout_plans
+        ))
+        db.execute(plan_version_bump(plan.assigned_user_id for plan in workout_plans))
+        db.commit()
+        invalidate_plan_feeds(plan.assigned_user_id for plan in workout_plans)
+        return ids
+    except Exception as e:
+        logger.error(f"Error bulk creating workout plans: {str(e)}")
+        db.rollback()
+        raise
+
+def create_meal_plans_bulk(db: Session, meal_plans: List[schemas.MealPlanCreate]) -> List[int]:
+    """Create many meal plans in one transaction and return their ids"""
+    try:
+        now = datetime.utcnow()
+        ids = _insert_plans(db, models.MealPlan.__table__, [
+            {
+                "title": plan.title,
+                "description": plan.description,
+                "meals": plan.serialize_meals(),
+                "user_id": plan.user_id,
+                "scheduled_date": to_naive_utc(plan.scheduled_date),
+                "template_id": plan.template_id,
+                "occurrence_date": to_naive_utc(plan.occurrence_date),
+                "created_at": now,
+            } for plan in meal_plans
+        ])
+        meal_rows = [
+            {"plan_id": plan_id, "position": position, **meal.dict()}
+            for plan_id, plan in zip(ids, meal_plans)
+            for position, meal in enumerate(plan.meals)
+        ]
+        if meal_rows:
+            db.execute(insert(models.PlanMeal.__table__), meal_rows)
+        db.execute(plan_version_bump(plan.user_id for plan in meal_plans))
+        db.commit()
+        invalidate_plan_feeds(plan.user_id for plan in meal_plans)
+        return ids
+    except Exception as e:
+        logger.error(f"Error bulk creating meal plans: {str(e)}")
+        db.rollback()
+        raise
+
+def create_plan_template(db: Session, template: schemas.PlanTemplateCreate) -> models.PlanTemplate:
+    """Create a recurring plan template"""
+    try:
+        db_template = models.PlanTemplate(
+            user_id=template.user_id,
+            kind=template.kind,
+            title=template.title,
+            description=template.description,
+            items_json=template.serialize_items(),
+            start_date=to_naive_utc(template.start_date),
+            until_date=to_naive_utc(template.until_date),
+            weekdays=format_weekdays(template.weekdays),
+            interval_weeks=template.interval_weeks
+        )
+        db.add(db_template)
+        db.execute(plan_version_bump([template.user_id]))
+        db.commit()
+        invalidate_plan_feeds([template.user_id])
+        db.refresh(db_template)
+        return db_template
+    except Exception as e:
+        logger.error(f"Error creating plan template: {str(e)}")
+        db.rollback()
+        raise
+
+def get_plan_templates(
+    db: Session,
+    user_ids: Collection[int],
+    kind: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> List[models.PlanTemplate]:
+    """Get the users' templates, limited to those active somewhere in the window"""
+    query = db.query(models.PlanTemplate).filter(models.PlanTemplate.user_id.in_(set(user_ids)))
+    if kind is not None:
+        query = query.filter(models.PlanTemplate.kind == kind)
+    if date_to is not None:
+        query = query.filter(models.PlanTemplate.start_date < to_naive_utc(date_to))
+    if date_from is not None:
+        # until_date covers its whole day
+        query = query.filter(or_(
+            models.PlanTemplate.until_date.is_(None),
+            models.PlanTemplate.until_date >= datetime.combine(to_naive_utc(date_from).date(), time.min)
+        ))
+    return query.order_by(models.PlanTemplate.id).all()
+
+def get_user_plan_templates(
+    db: Session,
+    user_id: int,
+    kind: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> List[models.PlanTemplate]:
+    """Get a user's templates, limited to those active somewhere in the window"""
+    return get_plan_templates(db, [user_id], kind, date_from, date_to)
+
+def get_plan_templates_by_id(db: Session, template_ids: Iterable[int]) -> Dict[int, models.PlanTemplate]:
+    """Load templates by id in one query, keyed by id"""
+    ids = set(template_ids)
+    if not ids:
+        return {}
+    templates = db.execute(select(models.PlanTemplate).where(models.PlanTemplate.id.in_(ids))).scalars()
+    return {template.id: template for template in templates}
+
+def get_plan_occurrences(
+    db: Session,
+    model,
+    kind: str,
+    user_ids: Collection[int],
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> List[Occurrence]:
+    """Expand the users' templates over the window, minus occurrences stored as override plans"""
+    templates = get_plan_templates(db, user_ids, kind, date_from, date_to)
+    if not templates:
+        return []
+    overridden = get_overridden_occurrences(db, model, [template.id for template in templates], date_from, date_to)
+    return expand_templates(templates, to_naive_utc(date_from), to_naive_utc(date_to), overridden)
+
+def get_overridden_occurrences(
+    db: Session,
+    model,
+    template_ids: Collection[int],
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> Set[Tuple[int, datetime]]:
+    """(template_id, occurrence_date) pairs replaced by a stored plan within the window"""
+    if not template_ids:
+        return set()
+    # Only a plan stored for the template's own user replaces one of its occurrences
+    query = db.query(model.template_id, model.occurrence_date).join(
+        models.PlanTemplate, models.PlanTemplate.id == model.template_id
+    ).filter(model.template_id.in_(template_ids), model.user_id == models.PlanTemplate.user_id)
+    query = filter_scheduled_window(query, model.occurrence_date, date_from, date_to)
+    return {(template_id, occurrence_date) for template_id, occurrence_date in query}
+
+class PlanFeed(NamedTuple):
+    """One page of a user's feed: stored plans and template occurrences, each in date order"""
+    plans: List[Any]
+    occurrences: List[Occurrence]
+    next_cursor: Optional[str]
+
+def _feed_key(scheduled_date: Optional[datetime], source: int, item_id: int):
+    # Undated plans last; on a shared date stored plans (0) before occurrences (1)
+    return (scheduled_date is None, scheduled_date or datetime.min, source, item_id)
+
+def get_user_plan_feed(
+    db: Session,
+    model,
+    kind: str,
+    user_id: int,
+    limit: Optional[int] = 100,
+    cursor: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> PlanFeed:
+    """
+    Page through a user's stored plans merged with their templates' occurrences.
+
+    The cursor holds the last item's (scheduled_date, id, template_id), with
+    id None for an occurrence, so both sources resume where the page ended.
+    Templates are expanded over the whole window on every page so that all
+    pages of an open-ended read share one horizon.
+    """
+    order = [model.scheduled_date, model.id]
+    query = db.query(model).filter(model.user_id == user_id)
+    query = filter_scheduled_window(query, model.scheduled_date, date_from, date_to)
+    occurrences = get_plan_occurrences(db, model, kind, [user_id], date_from, date_to)
+    if cursor:
+        scheduled_date, plan_id, template_id = decode_cursor(cursor, [model.scheduled_date, model.id, model.template_id])
+        if plan_id is not None:
+            query = query.filter(after_cursor(order, [scheduled_date, plan_id]))
+            after = _feed_key(scheduled_date, 0, plan_id)
+        elif scheduled_date is not None and template_id is not None:
+            query = query.filter(after_cursor(order[:1], [scheduled_date]))
+            after = _feed_key(scheduled_date, 1, template_id)
+        else:
+            raise invalid_cursor()
+        occurrences = [
+            occurrence for occurrence in occurrences
+            if _feed_key(occurrence.scheduled_date, 1, occurrence.template.id) > after
+        ]
+
+    # The first `limit` plans are enough: anything later sorts after them
+    page = keyset_paginate(query, order, limit)
+    items = [(_feed_key(plan.scheduled_date, 0, plan.id), plan) for plan in page.items]
+    items += [(_feed_key(occurrence.scheduled_date, 1, occurrence.template.id), occurrence) for occurrence in occurrences]
+    items.sort(key=lambda item: item[0])
+    next_cursor = None
+    if limit is not None and (len(items) > limit or page.next_cursor):
+        items = items[:limit]
+        last = items[-1][1]
+        if isinstance(last, Occurrence):
+            next_cursor = encode_cursor([last.scheduled_date, None, last.template.id])
+        else:
+            next_cursor = encode_cursor([last.scheduled_date, last.id, None])
+    return PlanFeed(
+        [item for _, item in items if not isinstance(item, Occurrence)],
+        [item for _, item in items if isinstance(item, Occurrence)],
+        next_cursor
+    )
+
+def get_plan_schedule_stats(db: Session, model, user_ids: Collection[int], now: datetime, week_end: datetime):
+    """
+    Per user with plans: the next plan on or after now (None if nothing is
+    upcoming), the number of plans in [now, week_end) and the latest
+    created_at, all from a single windowed query.
+    """
+    upcoming = and_(model.scheduled_date >= now, model.scheduled_date < week_end)
+    ranked = select(
+        model.user_id,
+        model.id,
+        model.title,
+        model.scheduled_date,
+        model.template_id,
+        func.count(case((upcoming, 1))).over(partition_by=model.user_id).label("upcoming"),
+        func.max(model.created_at).over(partition_by=model.user_id).label("last_created_at"),
+        func.row_number().over(
+            partition_by=model.user_id,
+            order_by=(case((model.scheduled_date >= now, 0), else_=1), model.scheduled_date, model.id)
+        ).label("rank")
+    ).where(model.user_id.in_(set(user_ids))).subquery()
+    stats = {}
+    for row in db.execute(select(ranked).where(ranked.c.rank == 1)):
+        stats[row.user_id] = {
+            "next": None if row.scheduled_date is None or row.scheduled_date < now else {
+                "id": row.id,
+                "title": row.title,
+                "scheduled_date": row.scheduled_date,
+                "template_id": row.template_id,
+            },
+            "upcoming": row.upcoming,
+            "last_created_at": row.last_created_at,
+        }
+    return stats
+
+def get_meal_macro_rows(
+    db: Session,
+    user_ids: Collection[int],
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+):
+    """Every stored meal of the users in the window as flat (user, plan, date, macros) rows"""
+    plans = models.MealPlan.__table__
+    meals = models.PlanMeal.__table__
+    query = select(
+        plans.c.user_id, plans.c.id, plans.c.scheduled_date,
+        meals.c.calories, meals.c.protein, meals.c.carbs, meals.c.fats
+    ).select_from(
+        meals.join(plans, meals.c.plan_id == plans.c.id)
+    ).where(plans.c.user_id.in_(set(user_ids)))
+    query = filter_scheduled_window(query, plans.c.scheduled_date, date_from, date_to)
+    return db.execute(query).all()
+
+def get_training_volume(
+    db: Session,
+    user_id: int,
+    exercise: Optional[str] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> List[models.TrainingVolume]:
+    """Weekly rollup rows for a user, ordered by exercise then week"""
+    query = db.query(models.TrainingVolume).filter(models.TrainingVolume.user_id == user_id)
+    if exercise:
+        query = query.filter(models.TrainingVolume.exercise == exercise_key(exercise))
+    if date_from is not None:
+        # Include the week date_from falls in
+        query = query.filter(models.TrainingVolume.period_start >= week_start(to_naive_utc(date_from)))
+    if date_to is not None:
+        query = query.filter(models.TrainingVolume.period_start < to_naive_utc(date_to).date())
+    return query.order_by(models.TrainingVolume.exercise, models.TrainingVolume.period_start).all()
+
+def update_password_hash(db: Session, user: models.User, hashed_password: str):
+    """Store a rehashed password after the configured bcrypt cost changed"""
+    try:
+        user.hashed_password = hashed_password
+        db.commit()
+    except Exception as e:
+        logger.error(f"Error rehashing password for user {user.id}: {str(e)}")
+        db.rollback()
+
 def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
     if user is None:
         return None
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = hashing.verify_and_update(password, user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        update_password_hash(db, user, new_hash)
+    return user
+
+# Async variants for the async endpoints; these take an AsyncSession
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """Get a user by email without loading relationships"""
+    result = await db.execute(select(models.User).filter(models.User.email == email))
+    return result.scalars().first()
+
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    """Create a user, hashing the password on the executor unless a hash is supplied"""
+    if hashed_password is None:
+        hashed_password = await hashing.get_password_hash_async(user.password)
+    db_user = models.User(
+        email=user.email,
+        hashed_password=hashed_password,
+        full_name=user.full_name,
+        is_admin=user.is_admin
+    )
+    db.add(db_user)
+    await db.commit()
+    identity_cache.invalidate(db_user.email)
+    return db_user
+
+async def get_existing_emails_async(db: AsyncSession, emails: Collection[str]) -> Set[str]:
+    """Return the subset of emails that are already registered, in one query"""
+    if not emails:
+        return set()
+    result = await db.execute(select(models.User.email).where(models.User.email.in_(set(emails))))
+    return set(result.scalars())
+
+async def create_users_bulk_async(
+    db: AsyncSession,
+    users: List[Tuple[schemas.UserImportRow, str]],
+    admin_id: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Insert (user, password hash) pairs and assign them to admin_id in one transaction.
+
+    Emails registered concurrently are skipped by ON CONFLICT rather than
+    failing the batch; they are told apart from this call's rows by their
+    (salted, so unique) password hash. Returns email -> id for the users
+    this call created.
+    """
+    table = models.User.__table__
+    dialect_name = db.bind.dialect.name
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    hashes = {user.email: hashed_password for user, hashed_password in users}
+    try:
+        await db.execute(
+            dialect_insert(table).on_conflict_do_nothing(index_elements=[table.c.email]),
+            [
+                {"email": user.email, "hashed_password": hashed_password, "full_name": user.full_name, "is_admin": False}
+                for user, hashed_password in users
+            ]
+        )
+        result = await db.execute(
+            select(table.c.id, table.c.email, table.c.hashed_password).where(table.c.email.in_(hashes))
+        )
+        created = {email: user_id for user_id, email, hashed_password in result if hashes[email] == hashed_password}
+        if admin_id is not None and created:
+            await db.execute(
+                _assignment_insert(dialect_name),
+                [{"admin_id": admin_id, "user_id": user_id} for user_id in created.values()]
+            )
+        await db.commit()
+    except Exception as e:
+        logger.error(f"Error bulk creating users: {str(e)}")
+        await db.rollback()
+        raise
+    for email in created:
+        identity_cache.invalidate(email)
+    return created
+
+async def assign_user_to_admin_async(db: AsyncSession, admin_id: int, user_id: int):
+    """Assign a user to an admin"""
+    try:
+        admin = await db.get(models.User, admin_id)
+        user = await db.get(models.User, user_id)
+        if not admin or not user:
+            logger.debug(f"Admin or user not found: admin_id={admin_id}, user_id={user_id}")
+            return None
+        if not admin.is_admin:
+            logger.debug(f"User {admin_id} is not an admin")
+            return None
+
+        # A concurrent assignment of the same pair is skipped rather than duplicated
+        result = await db.execute(
+            _assignment_insert(db.bind.dialect.name).values(admin_id=admin_id, user_id=user_id)
+        )
+        await db.commit()
+        if result.rowcount:
+            identity_cache.invalidate(admin.email)
+            logger.info(f"Successfully assigned user {user_id} to admin {admin_id}")
+        else:
+            logger.debug(f"User {user_id} is already assigned to admin {admin_id}")
+        return user
+    except Exception as e:
+        logger.error(f"Error assigning user to admin: {str(e)}")
+        await db.rollback()
+        raise
+
+async def get_plan_templates_by_id_async(db: AsyncSession, template_ids: Iterable[int]) -> Dict[int, models.PlanTemplate]:
+    """Load templates by id in one query, keyed by id"""
+    ids = set(template_ids)
+    if not ids:
+        return {}
+    result = await db.execute(select(models.PlanTemplate).where(models.PlanTemplate.id.in_(ids)))
+    return {template.id: template for template in result.scalars()}
+
+async def create_meal_plan_async(db: AsyncSession, meal_plan: schemas.MealPlanCreate):
+    """Create a new meal plan"""
+    try:
+        db_meal_plan = models.MealPlan(
+            title=meal_plan.title,
+            description=meal_plan.description,
+            scheduled_date=to_naive_utc(meal_plan.scheduled_date),
+            meals_json=meal_plan.serialize_meals(),
+            meals=build_plan_meals(meal_plan.meals),
+            user_id=meal_plan.user_id,
+            template_id=meal_plan.template_id,
+            occurrence_date=to_naive_utc(meal_plan.occurrence_date)
+        )
+        db.add(db_meal_plan)
+        await db.execute(plan_version_bump([meal_plan.user_id]))
+        await db.commit()
+        invalidate_plan_feeds([meal_plan.user_id])
+        return db_meal_plan
+    except Exception as e:
+        logger.error(f"Error creating meal plan: {str(e)}")
+        await db.rollback()
+        raise e
+
+async def update_password_hash_async(db: AsyncSession, user: models.User, hashed_password: str):
+    """Store a rehashed password after the configured bcrypt cost changed"""
+    try:
+        user.hashed_password = hashed_password
+        await db.commit()
+    except Exception as e:
+        logger.error(f"Error rehashing password for user {user.id}: {str(e)}")
+        await db.rollback()
+
+async def authenticate_user_async(db: AsyncSession, email: str, password: str):
+    """Authenticate a user, verifying the password on the hashing executor"""
+    user = await get_user_by_email_async(db, email)
+    if user is None:
+        return None
+    verified, new_hash = await hashing.verify_and_update_async(password, user.hashed_password)
+    if not verified:
         return None
-    return user 
\ No newline at end of file
+    if new_hash:
+        await update_password_hash_async(db, user, new_hash)
+    return user
@@ -1,12 +1,16 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import os
 from dotenv import load_dotenv
 import logging
+import threading
+import time
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 load_dotenv()
@@ -15,8 +19,7 @@ load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 DATABASE_PUBLIC_URL = os.getenv("DATABASE_PUBLIC_URL")
 
-# Log environment variables for debugging
-logger.info(f"Environment variables present: {list(os.environ.keys())}")
+# Log which database settings are present (never the values)
 logger.info(f"DATABASE_URL present: {bool(DATABASE_URL)}")
 logger.info(f"DATABASE_PUBLIC_URL present: {bool(DATABASE_PUBLIC_URL)}")
 
@@ -37,6 +40,95 @@ if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
     logger.info("Modified postgres:// to postgresql:// in database URL")
 
+# Connection pool settings, sized against real concurrency via /internal/pool-stats
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Liveness is checked by the pool on checkout instead of a per-request probe
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() not in ("0", "false", "no")
+
+class PoolStats:
+    """Checkout and wait-time counters for one connection pool"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_wait(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+            if timed_out:
+                self.timeouts += 1
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_ms_avg": (self.wait_seconds_total / self.checkouts) * 1000 if self.checkouts else 0.0,
+            }
+
+class _TimedCheckoutMixin:
+    """Measure how long callers wait for a pooled connection"""
+    stats: PoolStats = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+class TimedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+def instrument_pool(pool_engine) -> PoolStats:
+    """Attach pool event listeners and wait timing to an engine's pool"""
+    stats = PoolStats()
+    pool = pool_engine.pool
+    if isinstance(pool, _TimedCheckoutMixin):
+        pool.stats = stats
+    event.listen(pool, "checkout", lambda *args: stats.increment("checkouts"))
+    event.listen(pool, "checkin", lambda *args: stats.increment("checkins"))
+    event.listen(pool, "connect", lambda *args: stats.increment("connects"))
+    event.listen(pool, "invalidate", lambda *args: stats.increment("invalidations"))
+    return stats
+
+def pool_options(timed_pool_class) -> dict:
+    return {
+        "poolclass": timed_pool_class,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
 # Create engine with connection pool settings
 try:
     if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
@@ -49,10 +141,7 @@ try:
         logger.info("Using PostgreSQL database")
         engine = create_engine(
             SQLALCHEMY_DATABASE_URL,
-            pool_size=5,
-            max_overflow=10,
-            pool_timeout=30,
-            pool_recycle=1800
+            **pool_options(TimedQueuePool)
         )
     logger.info("Database engine created successfully")
 except Exception as e:
@@ -62,11 +151,75 @@ except Exception as e:
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+def to_async_url(url: str):
+    """Map a sync database URL onto its asyncio driver (asyncpg / aiosqlite)"""
+    async_url = make_url(url)
+    connect_args = {}
+    if async_url.drivername in ("postgresql", "postgresql+psycopg2"):
+        async_url = async_url.set(drivername="postgresql+asyncpg")
+        # asyncpg takes ssl as a connect argument rather than libpq's sslmode
+        sslmode = async_url.query.get("sslmode")
+        if sslmode:
+            async_url = async_url.difference_update_query(["sslmode"])
+            if sslmode != "disable":
+                connect_args["ssl"] = sslmode
+    elif async_url.drivername in ("sqlite", "sqlite+pysqlite"):
+        async_url = async_url.set(drivername="sqlite+aiosqlite")
+    return async_url, connect_args
+
+# Async engine for the async endpoints, sharing the same database
+try:
+    ASYNC_DATABASE_URL, async_connect_args = to_async_url(SQLALCHEMY_DATABASE_URL)
+    if ASYNC_DATABASE_URL.drivername.startswith("sqlite"):
+        async_engine = create_async_engine(ASYNC_DATABASE_URL, connect_args=async_connect_args)
+    else:
+        async_engine = create_async_engine(
+            ASYNC_DATABASE_URL,
+            connect_args=async_connect_args,
+            **pool_options(TimedAsyncAdaptedQueuePool)
+        )
+    logger.info("Async database engine created successfully")
+except Exception as e:
+    logger.error(f"Error creating async database engine: {str(e)}")
+    raise
+
+engine_pool_stats = instrument_pool(engine)
+async_engine_pool_stats = instrument_pool(async_engine.sync_engine)
+
+def _describe_pool(pool_engine, stats: PoolStats) -> dict:
+    pool = pool_engine.pool
+    description = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        description.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "max_overflow": DB_MAX_OVERFLOW,
+            "timeout_seconds": DB_POOL_TIMEOUT,
+        })
+    description.update(stats.snapshot())
+    return description
+
+def pool_stats() -> dict:
+    """Live connection pool statistics for the sync and async engines"""
+    return {
+        "sync": _describe_pool(engine, engine_pool_stats),
+        "async": _describe_pool(async_engine.sync_engine, async_engine_pool_stats),
+    }
+
+# expire_on_commit=False: attributes stay readable after commit without an
+# implicit (and, under asyncio, forbidden) lazy refresh
+AsyncSessionLocal = sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 def get_db():
     db = SessionLocal()
     try:
-        # Test the connection
-        db.execute("SELECT 1")
         yield db
     except Exception as e:
         logger.error(f"Database connection error: {str(e)}")
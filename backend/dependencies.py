@@ -1,5 +1,6 @@
-from typing import Generator
-from database import SessionLocal
+from typing import AsyncGenerator, Generator
+from database import SessionLocal, AsyncSessionLocal
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 def get_db() -> Generator[Session, None, None]:
@@ -7,4 +8,8 @@ def get_db() -> Generator[Session, None, None]:
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,52 @@
+"""
+Strong ETags for the per-user plan feeds.
+
+A feed's representation is fully determined by the user, the user's plan
+version (bumped on every plan write), the query parameters and, for reads
+without a `to` date, the day recurring templates are expanded ahead from.
+The tag can therefore be computed and checked against If-None-Match from
+the users table alone, before any plan row is read.
+"""
+from fastapi import Request, Response
+from hashlib import blake2b
+from datetime import date
+from typing import Dict, Optional
+
+# Browsers must revalidate, but may keep the body for a 304
+PLAN_FEED_CACHE_CONTROL = "private, no-cache"
+# Content codings the feeds are served in, each under its own strong tag
+ENCODED_VARIANTS = ("gzip", "br")
+
+def plan_feed_etag(feed: str, user_id: int, version: int, query: str, horizon: Optional[date] = None) -> str:
+    """Pass the template horizon anchor for open-ended reads so the tag moves with it"""
+    if horizon is not None:
+        query = f"{query}#{horizon.isoformat()}"
+    params = blake2b(query.encode(), digest_size=8).hexdigest()
+    return f'"{feed}-{user_id}-{version}-{params}"'
+
+def matches_if_none_match(request: Request, etag: str) -> bool:
+    """Weak comparison against If-None-Match, as RFC 7232 specifies for GET; any coding's tag matches"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(_base_etag(candidate.strip().removeprefix("W/")) == etag for candidate in header.split(","))
+
+def encoded_etag(etag: str, coding: str) -> str:
+    """Tag of the representation sent with Content-Encoding: coding"""
+    return f'{etag[:-1]}-{coding}"'
+
+def _base_etag(etag: str) -> str:
+    for coding in ENCODED_VARIANTS:
+        suffix = f'-{coding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    # The body varies by coding, so shared caches must key 304s on it too
+    return {"ETag": etag, "Cache-Control": PLAN_FEED_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
@@ -0,0 +1,131 @@
+"""
+Streaming export of stored workout and meal plans as NDJSON or CSV.
+
+Plans are read through a server-side cursor (yield_per) and written out in
+fixed-size chunks, so memory stays flat however long the history is. The
+generator opens and closes its own session: FastAPI runs the exit code of
+yield dependencies before a StreamingResponse body is sent, so a session
+from get_db would already be closed.
+"""
+from datetime import date, datetime
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from typing import Iterator, Optional, Sequence, Union
+import csv
+import io
+import logging
+import os
+import orjson
+
+from crud import filter_scheduled_window
+from database import SessionLocal
+from serialization import meal_plan_payload, workout_plan_payload
+import models
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Encoded rows are buffered up to about this size before each write
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+
+EXPORT_FORMATS = ("ndjson", "csv")
+PLAN_KINDS = ("workout", "meal")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+CSV_COLUMNS = (
+    "kind", "id", "user_id", "title", "description", "scheduled_date",
+    "created_at", "template_id", "occurrence_date", "items",
+)
+
+_PLANS = {
+    "workout": (models.WorkoutPlan, workout_plan_payload, "exercises"),
+    "meal": (models.MealPlan, meal_plan_payload, "meals"),
+}
+
+def _owner_filter(column, user_id: Optional[int], admin_id: Optional[int]):
+    """One user's plans, or the plans of everyone assigned to admin_id"""
+    if user_id is not None:
+        return column == user_id
+    association = models.admin_user_association
+    return column.in_(select(association.c.user_id).where(association.c.admin_id == admin_id))
+
+def _payloads(db, kinds: Sequence[str], user_id, admin_id, date_from, date_to) -> Iterator[dict]:
+    for kind in kinds:
+        model, build_payload, items_key = _PLANS[kind]
+        query = select(model).where(_owner_filter(model.user_id, user_id, admin_id))
+        query = filter_scheduled_window(query, model.scheduled_date, date_from, date_to)
+        query = query.order_by(model.user_id, model.scheduled_date, model.id).execution_options(
+            yield_per=EXPORT_BATCH_SIZE
+        )
+        # Plans are only weakly referenced by the session, so each batch is
+        # released once it has been written
+        for plan in db.execute(query).scalars():
+            payload = build_payload(plan)
+            if payload is None:
+                continue
+            payload["kind"] = kind
+            payload["items"] = payload.pop(items_key)
+            yield payload
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return orjson.dumps(value).decode()
+    return value
+
+def _encoded_rows(payloads: Iterator[dict], export_format: str) -> Iterator[bytes]:
+    if export_format == "ndjson":
+        for payload in payloads:
+            yield orjson.dumps(payload, option=orjson.OPT_APPEND_NEWLINE)
+        return
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for payload in payloads:
+        writer.writerow([_csv_value(payload[column]) for column in CSV_COLUMNS])
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # A header with no plans still produces a valid CSV
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def stream_plans(
+    export_format: str,
+    kinds: Sequence[str] = PLAN_KINDS,
+    user_id: Optional[int] = None,
+    admin_id: Optional[int] = None,
+    date_from: Union[datetime, date, None] = None,
+    date_to: Union[datetime, date, None] = None
+) -> Iterator[bytes]:
+    """Encoded plans in chunks of about EXPORT_CHUNK_BYTES, reading through a session of its own"""
+    db = SessionLocal()
+    try:
+        chunk = []
+        size = 0
+        for row in _encoded_rows(_payloads(db, kinds, user_id, admin_id, date_from, date_to), export_format):
+            chunk.append(row)
+            size += len(row)
+            if size >= EXPORT_CHUNK_BYTES:
+                yield b"".join(chunk)
+                chunk = []
+                size = 0
+        if chunk:
+            yield b"".join(chunk)
+    except Exception as e:
+        # Headers are already sent; the client sees a truncated body
+        logger.error(f"Plan export failed: {str(e)}")
+        raise
+    finally:
+        db.close()
+
+def export_response(export_format: str, **options) -> StreamingResponse:
+    filename = f"plans-{datetime.utcnow():%Y%m%d}.{export_format}"
+    return StreamingResponse(
+        stream_plans(export_format, **options),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,180 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dotenv import load_dotenv
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+# Executor configuration
+HASH_EXECUTOR = os.getenv("HASH_EXECUTOR", "process").lower()  # "process" or "thread"
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", "0")) or (os.cpu_count() or 1)
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "0")) or HASH_WORKERS * 4
+# Process workers start clean rather than forking the server with its threads,
+# open connections and event loop; spawn where forkserver is unavailable
+HASH_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# bcrypt cost factor, tuned per host with calibrate_hashing.py. Pinning the
+# min and max to the same value makes needs_update() flag any hash whose
+# cost differs, so logins migrate hashes in either direction.
+BCRYPT_ROUNDS = os.getenv("BCRYPT_ROUNDS")
+
+def build_context(rounds: Optional[int] = None) -> CryptContext:
+    if rounds is None:
+        return CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+pwd_context = build_context(int(BCRYPT_ROUNDS) if BCRYPT_ROUNDS else None)
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+def verify_and_update(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """Verify a password and return a replacement hash if the stored cost is stale"""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+class HashingStats:
+    """Thread-safe timing counters for hash and verify calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self.rejected = 0
+
+    def record(self, operation: str, queued: float, elapsed: float) -> None:
+        with self._lock:
+            count, total, max_elapsed, total_queued = self._counters.get(operation, (0, 0.0, 0.0, 0.0))
+            self._counters[operation] = (
+                count + 1,
+                total + elapsed,
+                max(max_elapsed, elapsed),
+                total_queued + queued,
+            )
+
+    def reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            operations = {
+                operation: {
+                    "count": count,
+                    "total_seconds": total,
+                    "avg_ms": (total / count) * 1000 if count else 0.0,
+                    "max_ms": max_elapsed * 1000,
+                    "avg_queue_ms": (total_queued / count) * 1000 if count else 0.0,
+                }
+                for operation, (count, total, max_elapsed, total_queued) in self._counters.items()
+            }
+            return {"operations": operations, "rejected": self.rejected}
+
+stats = HashingStats()
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+_in_flight = 0
+
+def get_executor() -> Executor:
+    """Return the shared hashing executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if HASH_EXECUTOR == "thread":
+                    _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="hashing")
+                else:
+                    _executor = ProcessPoolExecutor(
+                        max_workers=HASH_WORKERS,
+                        mp_context=multiprocessing.get_context(HASH_START_METHOD)
+                    )
+                logger.info(f"Started {HASH_EXECUTOR} hashing executor with {HASH_WORKERS} workers")
+    return _executor
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def _timed_call(func, *args):
+    """Run func in the worker and report how long the hash itself took"""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+async def _submit(operation: str, func, *args):
+    global _in_flight
+    if _in_flight >= HASH_QUEUE_LIMIT:
+        stats.reject()
+        logger.warning(f"Hashing queue saturated ({_in_flight} in flight), rejecting {operation}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": "1"},
+        )
+
+    _in_flight += 1
+    submitted = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        result, elapsed = await loop.run_in_executor(get_executor(), _timed_call, func, *args)
+    finally:
+        _in_flight -= 1
+    stats.record(operation, time.perf_counter() - submitted - elapsed, elapsed)
+    metrics.observe("password_hash_duration_seconds", (("operation", operation),), elapsed)
+    return result
+
+async def verify_password_async(plain_password, hashed_password) -> bool:
+    """Verify a password on the hashing executor without blocking the event loop"""
+    return await _submit("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password) -> str:
+    """Hash a password on the hashing executor without blocking the event loop"""
+    return await _submit("hash", get_password_hash, password)
+
+async def verify_and_update_async(plain_password, hashed_password) -> Tuple[bool, Optional[str]]:
+    """verify_and_update on the hashing executor without blocking the event loop"""
+    return await _submit("verify", verify_and_update, plain_password, hashed_password)
+
+async def hash_passwords_async(passwords: Sequence[str]) -> List[str]:
+    """
+    Hash a batch of passwords across the executor's workers, for bulk imports.
+
+    At most HASH_WORKERS hashes are queued at a time, so interactive logins
+    still reach a worker between them. The batch is not subject to
+    HASH_QUEUE_LIMIT; an import should not be rejected part way through.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    slots = asyncio.Semaphore(HASH_WORKERS)
+
+    async def hash_one(password: str) -> str:
+        async with slots:
+            submitted = time.perf_counter()
+            result, elapsed = await loop.run_in_executor(executor, _timed_call, get_password_hash, password)
+        stats.record("bulk_hash", time.perf_counter() - submitted - elapsed, elapsed)
+        metrics.observe("password_hash_duration_seconds", (("operation", "bulk_hash"),), elapsed)
+        return result
+
+    return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
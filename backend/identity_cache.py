@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, FrozenSet, Optional
+import os
+import threading
+import time
+
+# Cache configuration
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "60"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "1024"))
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Detached, read-only view of an authenticated user"""
+    id: int
+    email: str
+    full_name: str
+    is_admin: bool
+    created_at: datetime
+    assigned_user_ids: FrozenSet[int]
+
+    @classmethod
+    def from_user(cls, user) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            is_admin=bool(user.is_admin),
+            created_at=user.created_at,
+            assigned_user_ids=frozenset(u.id for u in user.assigned_users)
+        )
+
+class IdentityCache:
+    """Bounded LRU cache of user snapshots keyed by token subject, with a TTL"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, subject: str) -> Optional[UserSnapshot]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, subject: str, snapshot: UserSnapshot) -> None:
+        if self.max_entries <= 0 or self.ttl_seconds <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._entries[subject] = (expires_at, snapshot)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, subject: str) -> None:
+        with self._lock:
+            self._entries.pop(subject, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+identity_cache = IdentityCache(IDENTITY_CACHE_MAX_ENTRIES, IDENTITY_CACHE_TTL_SECONDS)
@@ -0,0 +1,133 @@
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+
+# Logging configuration. Production defaults to warnings only; set
+# APP_ENV=development (or LOG_LEVEL) for chattier local logs.
+APP_ENV = os.getenv("APP_ENV", "production").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING" if APP_ENV == "production" else "INFO").upper()
+ACCESS_LOG_ENABLED = os.getenv("ACCESS_LOG", "1").lower() not in ("0", "false", "no")
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+# Comma separated "path_prefix=rate" pairs, longest prefix wins
+ACCESS_LOG_SAMPLE_RATES = os.getenv("ACCESS_LOG_SAMPLE_RATES", "/_health=0")
+
+access_logger = logging.getLogger("access")
+
+_RESERVED_ATTRS = frozenset(vars(logging.makeLogRecord({})).keys()) | {"message", "asctime"}
+
+class JSONFormatter(logging.Formatter):
+    """Render each record as one compact JSON line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+_listener: Optional[QueueListener] = None
+
+def setup_logging() -> None:
+    """Route all logging through a queue drained by a background writer thread"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(LOG_LEVEL)
+
+    # Access lines are sampled separately, so keep them at INFO regardless
+    # of how quiet the application loggers are.
+    access_logger.setLevel(logging.INFO if ACCESS_LOG_ENABLED else logging.CRITICAL + 1)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+def _parse_sample_rates(spec: str) -> List[Tuple[str, float]]:
+    rates = []
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        prefix, rate = item.split("=", 1)
+        rates.append((prefix.strip(), float(rate)))
+    # Longest prefix first so the most specific route wins
+    return sorted(rates, key=lambda pair: len(pair[0]), reverse=True)
+
+class AccessLogMiddleware:
+    """Pure ASGI middleware writing one sampled access line per request"""
+
+    def __init__(self, app, sample_rate: float = ACCESS_LOG_SAMPLE_RATE, sample_rates: str = ACCESS_LOG_SAMPLE_RATES):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.sample_rates = _parse_sample_rates(sample_rates)
+        self._route_rates: Dict[str, float] = {}
+
+    def _rate_for(self, path: str) -> float:
+        rate = self._route_rates.get(path)
+        if rate is None:
+            rate = self.sample_rate
+            for prefix, prefix_rate in self.sample_rates:
+                if path.startswith(prefix):
+                    rate = prefix_rate
+                    break
+            if len(self._route_rates) < 1024:
+                self._route_rates[path] = rate
+        return rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not access_logger.isEnabledFor(logging.INFO):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path = scope["path"]
+            # Server errors are always logged, everything else is sampled
+            rate = 1.0 if status_code >= 500 else self._rate_for(path)
+            if rate >= 1.0 or (rate > 0 and random.random() < rate):
+                client = scope.get("client")
+                access_logger.info(
+                    "request",
+                    extra={
+                        "method": scope["method"],
+                        "path": path,
+                        "status": status_code,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                        "client": client[0] if client else None,
+                    },
+                )
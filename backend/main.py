@@ -1,27 +1,31 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Request, Response
+from fastapi import FastAPI, Depends, HTTPException, status, Request, Response, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.exceptions import RequestValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-import models, schemas, crud
-from database import engine, SessionLocal
-from datetime import timedelta
+from typing import Dict, Iterable, List, Literal, Optional, Tuple, Union
+import models, schemas, crud, etag, export, hashing, metrics, migrations, nutrition, profiling, recurrence, roster, serialization, slow_query, user_import
+from database import engine, async_engine, SessionLocal, pool_stats
+from datetime import date, datetime, timedelta
 from auth import create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from dependencies import get_db
+from identity_cache import UserSnapshot, identity_cache
+from dependencies import get_db, get_async_db
+from pagination import Page
+from response_cache import CachedResponse, response_cache
 import logging
 import os
 from dotenv import load_dotenv
-from fastapi.middleware.cors import CORSMiddleware
-import json
 from cors_config import setup_cors
+from logging_config import setup_logging, AccessLogMiddleware
 import traceback
+from itertools import groupby
 
 # Load environment variables
 load_dotenv()
 
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Create FastAPI app
@@ -45,34 +49,22 @@ setup_cors(app, allowed_origins)
 logger.info("Starting application with configuration:")
 logger.info(f"Current working directory: {os.getcwd()}")
 
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    origin = request.headers.get("origin")
-    logger.info(f"Incoming request: {request.method} {request.url}")
-    logger.info(f"Request headers: {dict(request.headers)}")
-    logger.info(f"Request origin: {origin}")
-    
-    # Handle preflight requests
-    if request.method == "OPTIONS":
-        if origin in allowed_origins:
-            response = Response(status_code=200)
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Methods"] = "POST, GET, DELETE, PUT, OPTIONS"
-            response.headers["Access-Control-Allow-Headers"] = "*"
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-            return response
-        return Response(status_code=400)
-    
-    response = await call_next(request)
-    
-    # Add CORS headers for all responses
-    if origin in allowed_origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-    
-    logger.info(f"Response status: {response.status_code}")
-    logger.info(f"Response headers: {dict(response.headers)}")
-    return response
+# Opt-in Server-Timing breakdowns and sampled profiles for signed requests
+app.add_middleware(profiling.ProfilingMiddleware)
+if profiling.PROFILING_ENABLED:
+    profiling.instrument_engine(engine)
+    profiling.instrument_engine(async_engine.sync_engine)
+
+# Statements over SLOW_QUERY_MS are logged with their plan, once per fingerprint
+if slow_query.SLOW_QUERY_MS > 0:
+    slow_query.instrument_engine(engine)
+    slow_query.instrument_engine(async_engine.sync_engine)
+
+# Per-route request counts and latency histograms for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
+# One compact, sampled access line per request (outermost user middleware, so it times everything)
+app.add_middleware(AccessLogMiddleware)
 
 @app.get("/")
 async def root():
@@ -80,26 +72,8 @@ async def root():
 
 @app.get("/_health")
 async def health_check():
-    logger.info("Health check endpoint called")
     return {"status": "healthy"}
 
-@app.options("/token")
-async def token_preflight(request: Request):
-    origin = request.headers.get("origin")
-    if origin in allowed_origins:
-        return PlainTextResponse(
-            status_code=200,
-            headers={
-                "Access-Control-Allow-Origin": origin,
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Authorization, Content-Type",
-                "Access-Control-Allow-Credentials": "true",
-                "Access-Control-Max-Age": "3600",
-            }
-        )
-    logger.warning(f"Rejected CORS preflight request from origin: {origin}")
-    return PlainTextResponse(status_code=400)
-
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting up FastAPI application")
@@ -113,59 +87,81 @@ async def startup_event():
         # Create database tables
         models.Base.metadata.create_all(bind=engine)
         logger.info("Successfully created database tables")
+
+        # Bring existing tables and data up to date
+        migrations.run_migrations(engine)
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
         raise
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    hashing.shutdown_executor()
+    await async_engine.dispose()
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Largest page a list endpoint will return in one response
+MAX_PAGE_SIZE = 500
+
+# Documents the paging headers on every list route
+PAGED_RESPONSES = {200: {"headers": {
+    "X-Next-Cursor": {"description": "Cursor for the next page; absent on the last page", "schema": {"type": "string"}},
+    "Link": {"description": 'rel="next" link to the next page; absent on the last page', "schema": {"type": "string"}},
+}}}
+
+def next_page_headers(request: Request, next_cursor: Optional[str]) -> Dict[str, str]:
+    """The cursor for the following page, if there is one, bare and as a relative next link"""
+    if not next_cursor:
+        return {}
+    url = request.url.include_query_params(cursor=next_cursor)
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{url.path}?{url.query}>; rel="next"'}
+
+def set_next_cursor(request: Request, response: Response, page: Page) -> None:
+    response.headers.update(next_page_headers(request, page.next_cursor))
+
+def check_override_templates(
+    templates: Dict[int, models.PlanTemplate],
+    overrides: Iterable[Tuple[int, int]],
+    kind: str
+) -> None:
+    """Reject (template_id, user_id) overrides whose template is missing or is not that user's template of kind"""
+    for template_id, user_id in overrides:
+        template = templates.get(template_id)
+        if template is None:
+            raise HTTPException(status_code=404, detail=f"Plan template not found: {template_id}")
+        if template.user_id != user_id or template.kind != kind:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Plan template {template_id} is not a {kind} template of user {user_id}"
+            )
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     # Log the full error
-    logging.error(f"Unhandled exception: {str(exc)}")
-    logging.error(traceback.format_exc())
-    
-    # Get origin from request
-    origin = request.headers.get("origin")
+    logger.error(f"Unhandled exception: {str(exc)}", exc_info=exc)
+    metrics.inc("exception_handler_total", (("handler", "unhandled"), ("status", "500")))
     
-    # Create response with CORS headers
-    response = JSONResponse(
+    return JSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "Internal server error occurred"},
     )
-    
-    if origin and origin in allowed_origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-    
-    return response
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
     # Log the error
-    logging.error(f"HTTP exception: {exc.detail}")
-    
-    # Get origin from request
-    origin = request.headers.get("origin")
+    logger.info(f"HTTP exception: {exc.detail}")
+    metrics.inc("exception_handler_total", (("handler", "http"), ("status", str(exc.status_code))))
     
-    # Create response with CORS headers
-    response = JSONResponse(
+    return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=exc.headers,
     )
-    
-    if origin and origin in allowed_origins:
-        response.headers["Access-Control-Allow-Origin"] = origin
-        response.headers["Access-Control-Allow-Credentials"] = "true"
-        
-    # Add any additional headers from the original exception
-    if exc.headers:
-        response.headers.update(exc.headers)
-    
-    return response
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
+    metrics.inc("exception_handler_total", (("handler", "validation"), ("status", "422")))
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors()},
@@ -175,12 +171,12 @@ async def validation_exception_handler(request, exc):
 async def login_for_access_token(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        logging.info(f"Login attempt for user: {form_data.username}")
+        logger.debug(f"Login attempt for user: {form_data.username}")
         
-        user = crud.authenticate_user(db, form_data.username, form_data.password)
+        user = await crud.authenticate_user_async(db, form_data.username, form_data.password)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -193,75 +189,61 @@ async def login_for_access_token(
             data={"sub": user.email}, expires_delta=access_token_expires
         )
         
-        # Get origin from request
-        origin = request.headers.get("origin")
-        
-        # Create response with token
-        response = JSONResponse(
-            content={"access_token": access_token, "token_type": "bearer"}
-        )
-        
-        # Add CORS headers if origin is allowed
-        if origin and origin in allowed_origins:
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
-        
-        logging.info(f"Login successful for user: {form_data.username}")
-        return response
+        logger.info(f"Login successful for user {user.id}")
+        return {"access_token": access_token, "token_type": "bearer"}
         
     except HTTPException as he:
         # Re-raise HTTP exceptions to be handled by the exception handler
         raise
     except Exception as e:
         # Log the error and re-raise as HTTP exception
-        logging.error(f"Login error for user {form_data.username}: {str(e)}")
-        logging.error(traceback.format_exc())
+        logger.error(f"Login error: {str(e)}")
+        logger.error(traceback.format_exc())
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred during login"
         )
 
 @app.get("/users/me", response_model=schemas.User)
-def read_users_me(current_user: models.User = Depends(get_current_user)):
+def read_users_me(current_user: UserSnapshot = Depends(get_current_user)):
     return current_user
 
 @app.post("/users/", response_model=schemas.User)
 async def create_user(
     user: schemas.UserCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new user and automatically assign them to the admin if created by an admin"""
-    logger.info(f"Creating new user with email: {user.email}")
+    logger.debug(f"Creating new user with email: {user.email}")
     
     try:
         # Check if email is already registered
-        db_user = crud.get_user_by_email(db, email=user.email)
+        db_user = await crud.get_user_by_email_async(db, email=user.email)
         if db_user:
-            logger.warning(f"Email already registered: {user.email}")
+            logger.warning("Registration rejected: email already registered")
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Check admin code if user is requesting admin privileges
         if user.is_admin:
             ADMIN_CODE = "admin123"  # In production, use environment variable
             if not user.admin_code or user.admin_code != ADMIN_CODE:
-                logger.warning(f"Invalid admin code attempt for user: {user.email}")
+                logger.warning("Invalid admin code attempt")
                 raise HTTPException(
                     status_code=403,
                     detail="Invalid admin code"
                 )
         
-        # Create the user
-        created_user = crud.create_user(db=db, user=user)
+        # Create the user (the password is hashed off the event loop)
+        created_user = await crud.create_user_async(db=db, user=user)
         
         # If the current user is an admin and the created user is not an admin,
         # automatically assign the new user to the admin
         if current_user.is_admin and not created_user.is_admin:
             logger.info(f"Automatically assigning user {created_user.id} to admin {current_user.id}")
-            crud.assign_user_to_admin(db, admin_id=current_user.id, user_id=created_user.id)
-            db.refresh(created_user)  # Refresh to get updated relationships
+            await crud.assign_user_to_admin_async(db, admin_id=current_user.id, user_id=created_user.id)
         
-        logger.info(f"Successfully created user: {user.email}")
+        logger.info(f"Successfully created user {created_user.id}")
         return created_user
         
     except HTTPException as he:
@@ -274,34 +256,55 @@ async def create_user(
             detail="An error occurred while creating the user"
         )
 
+@app.post("/users/import", response_model=schemas.UserImportReport)
+async def import_users(
+    request: Request,
+    import_format: Optional[Literal["csv", "ndjson"]] = Query(
+        None, alias="format", description="Defaults to the request's Content-Type"
+    ),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Create client accounts from a streamed CSV or NDJSON upload and assign them to the current admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to import users")
+    import_format = import_format or user_import.format_from_content_type(request.headers.get("content-type", ""))
+    if import_format is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson, or pass format=csv|ndjson"
+        )
+    importer = user_import.UserImporter(db, admin=current_user)
+    return await importer.run(user_import.iter_lines(request.stream()), import_format)
+
 @app.post("/register", response_model=schemas.User)
 async def register_user(
     user: schemas.UserCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Register a new user (no authentication required)"""
-    logger.info(f"Registering new user with email: {user.email}")
+    logger.debug(f"Registering new user with email: {user.email}")
     
     try:
         # Check if email is already registered
-        db_user = crud.get_user_by_email(db, email=user.email)
+        db_user = await crud.get_user_by_email_async(db, email=user.email)
         if db_user:
-            logger.warning(f"Email already registered: {user.email}")
+            logger.warning("Registration rejected: email already registered")
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Check admin code if user is requesting admin privileges
         if user.is_admin:
             ADMIN_CODE = "admin123"  # In production, use environment variable
             if not user.admin_code or user.admin_code != ADMIN_CODE:
-                logger.warning(f"Invalid admin code attempt for user: {user.email}")
+                logger.warning("Invalid admin code attempt")
                 raise HTTPException(
                     status_code=403,
                     detail="Invalid admin code"
                 )
         
-        # Create the user
-        created_user = crud.create_user(db=db, user=user)
-        logger.info(f"Successfully registered user: {user.email}")
+        # Create the user (the password is hashed off the event loop)
+        created_user = await crud.create_user_async(db=db, user=user)
+        logger.info(f"Successfully registered user {created_user.id}")
         return created_user
         
     except HTTPException as he:
@@ -314,51 +317,71 @@ async def register_user(
             detail="An error occurred while registering the user"
         )
 
-@app.get("/users/", response_model=List[schemas.User])
+@app.get("/users/", response_model=List[schemas.User], responses=PAGED_RESPONSES)
 def read_users(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(get_current_user)
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0, description="Legacy offset paging; prefer cursor"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Get all users (for admins) or assigned users (for regular users)"""
-    with get_db() as db:
-        if not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Not authorized to view users")
-        return crud.get_users(db, skip=skip, limit=limit, admin_id=current_user.id)
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view users")
+    page = crud.get_users(db, skip=skip, limit=limit, admin_id=current_user.id, cursor=cursor)
+    set_next_cursor(request, response, page)
+    return page.items
+
+@app.post("/users/assign", response_model=schemas.AssignmentResult)
+def assign_users(
+    assignment: schemas.UserAssignment,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Assign many users to the current admin in one statement"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to assign users")
+
+    user_ids = set(assignment.user_ids)
+    missing = user_ids - crud.get_existing_user_ids(db, user_ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"User not found: {sorted(missing)}")
+
+    assigned = crud.assign_users_to_admin(db, admin_id=current_user.id, user_ids=user_ids)
+    if assigned is None:
+        raise HTTPException(status_code=400, detail="Failed to assign users")
+    return {"assigned": sorted(assigned), "already_assigned": sorted(user_ids - assigned)}
 
 @app.post("/users/assign/{user_id}", response_model=schemas.User)
 def assign_user_to_admin(
     user_id: int,
-    current_user: models.User = Depends(get_current_user)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
     """Assign a user to an admin"""
     logger.info(f"Attempting to assign user {user_id} to admin {current_user.id}")
-    with get_db() as db:
-        if not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Not authorized to assign users")
-        
-        # Check if user exists
-        user = crud.get_user(db, user_id=user_id)
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Check if user is already assigned to this admin
-        admin = crud.get_user(db, user_id=current_user.id)
-        if user in admin.assigned_users:
-            logger.info(f"User {user_id} is already assigned to admin {current_user.id}")
-            return user
-        
-        result = crud.assign_user_to_admin(db, admin_id=current_user.id, user_id=user_id)
-        if not result:
-            raise HTTPException(status_code=400, detail="Failed to assign user")
-        
-        logger.info(f"Successfully assigned user {user_id} to admin {current_user.id}")
-        return result
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to assign users")
+
+    # Check if user exists
+    user = crud.get_user(db, user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Assigning an already assigned user is a no-op
+    result = crud.assign_user_to_admin(db, admin_id=current_user.id, user_id=user_id)
+    if not result:
+        raise HTTPException(status_code=400, detail="Failed to assign user")
+
+    logger.info(f"Successfully assigned user {user_id} to admin {current_user.id}")
+    return result
 
 @app.post("/workout-plans/", response_model=schemas.WorkoutPlan)
 def create_workout_plan(
     workout_plan: schemas.WorkoutPlanCreate,
-    current_user: models.User = Depends(get_current_user),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a workout plan"""
@@ -372,36 +395,25 @@ def create_workout_plan(
             raise HTTPException(status_code=404, detail="Assigned user not found")
         
         # If admin has assigned users, verify this user is one of them
-        if current_user.assigned_users and assigned_user.id not in [u.id for u in current_user.assigned_users]:
+        if current_user.assigned_user_ids and assigned_user.id not in current_user.assigned_user_ids:
             raise HTTPException(status_code=403, detail="Not authorized to create plans for this user")
+
+        if workout_plan.template_id is not None:
+            check_override_templates(
+                crud.get_plan_templates_by_id(db, [workout_plan.template_id]),
+                [(workout_plan.template_id, assigned_user.id)],
+                "workout"
+            )
         
         # Create the workout plan
         try:
-            # Create a dict of the workout plan data
-            workout_plan_data = {
-                "title": workout_plan.title,
-                "description": workout_plan.description,
-                "scheduled_date": workout_plan.scheduled_date,
-                "exercises": workout_plan.serialize_exercises(),
-                "user_id": workout_plan.assigned_user_id
-            }
-            
-            # Create the workout plan in the database
-            db_workout_plan = models.WorkoutPlan(**workout_plan_data)
-            db.add(db_workout_plan)
-            db.commit()
-            db.refresh(db_workout_plan)
-            
-            # Deserialize exercises before returning
-            if db_workout_plan.exercises:
-                db_workout_plan.exercises = json.loads(db_workout_plan.exercises)
+            db_workout_plan = crud.create_workout_plan(db, workout_plan)
             
             logger.info(f"Successfully created workout plan for user {assigned_user.id}")
             return db_workout_plan
             
         except Exception as e:
             logger.error(f"Error creating workout plan: {str(e)}")
-            db.rollback()
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Failed to create workout plan: {str(e)}"
@@ -426,37 +438,30 @@ def create_workout_plan(
 @app.post("/meal-plans/", response_model=schemas.MealPlan)
 async def create_meal_plan(
     meal_plan: schemas.MealPlanCreate,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        logger.info(f"Received meal plan data: {meal_plan.dict()}")
-        
+
         if not meal_plan.user_id:
             meal_plan.user_id = current_user.id
-            logger.info(f"Set user_id to current user: {current_user.id}")
+            logger.debug(f"Set user_id to current user: {current_user.id}")
         
         if meal_plan.user_id != current_user.id and not current_user.is_admin:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="You can only create meal plans for yourself unless you are an admin"
             )
+
+        if meal_plan.template_id is not None:
+            check_override_templates(
+                await crud.get_plan_templates_by_id_async(db, [meal_plan.template_id]),
+                [(meal_plan.template_id, meal_plan.user_id)],
+                "meal"
+            )
             
-        # Create a dict of the meal plan data
-        meal_plan_data = meal_plan.dict()
-        logger.info(f"Meal plan data before serialization: {meal_plan_data}")
-        
-        # Serialize the meals list to a JSON string
-        try:
-            meal_plan_data['meals'] = meal_plan.serialize_meals()
-            logger.info(f"Successfully serialized meals: {meal_plan_data['meals']}")
-        except Exception as e:
-            logger.error(f"Error serializing meals: {str(e)}")
-            raise ValueError(f"Failed to serialize meals: {str(e)}")
-            
-        logger.info(f"Creating meal plan with data: {meal_plan_data}")
-        created_meal_plan = crud.create_meal_plan(db=db, meal_plan=schemas.MealPlanCreate(**meal_plan_data))
-        logger.info(f"Successfully created meal plan: {created_meal_plan}")
+        created_meal_plan = await crud.create_meal_plan_async(db=db, meal_plan=meal_plan)
+        logger.info(f"Successfully created meal plan {created_meal_plan.id} for user {created_meal_plan.user_id}")
         
         return created_meal_plan
         
@@ -467,6 +472,8 @@ async def create_meal_plan(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error creating meal plan: {str(e)}")
         logger.error(traceback.format_exc())
@@ -475,30 +482,157 @@ async def create_meal_plan(
             detail="An unexpected error occurred while creating the meal plan"
         )
 
-@app.get("/workout-plans/user", response_model=List[schemas.WorkoutPlan])
+@app.post("/workout-plans/bulk", response_model=schemas.BulkCreateResult)
+def create_workout_plans_bulk(
+    bulk: schemas.WorkoutPlanBulkCreate,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create many workout plans in one transaction"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to create workout plans")
+
+    # Authorize every target user once, however many plans they receive
+    user_ids = {plan.assigned_user_id for plan in bulk.plans}
+    missing = user_ids - crud.get_existing_user_ids(db, user_ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Assigned user not found: {sorted(missing)}")
+    if current_user.assigned_user_ids and not user_ids <= current_user.assigned_user_ids:
+        raise HTTPException(status_code=403, detail="Not authorized to create plans for this user")
+    overrides = {(plan.template_id, plan.assigned_user_id) for plan in bulk.plans if plan.template_id is not None}
+    templates = crud.get_plan_templates_by_id(db, [template_id for template_id, _ in overrides])
+    check_override_templates(templates, sorted(overrides), "workout")
+
+    try:
+        ids = crud.create_workout_plans_bulk(db, bulk.plans)
+    except Exception as e:
+        logger.error(f"Error bulk creating workout plans: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while creating the workout plans"
+        )
+    logger.info(f"Created {len(ids)} workout plans for {len(user_ids)} users")
+    return {"ids": ids}
+
+@app.post("/meal-plans/bulk", response_model=schemas.BulkCreateResult)
+def create_meal_plans_bulk(
+    bulk: schemas.MealPlanBulkCreate,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create many meal plans in one transaction"""
+    for plan in bulk.plans:
+        if not plan.user_id:
+            plan.user_id = current_user.id
+
+    user_ids = {plan.user_id for plan in bulk.plans}
+    if user_ids != {current_user.id} and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only create meal plans for yourself unless you are an admin"
+        )
+    missing = user_ids - crud.get_existing_user_ids(db, user_ids)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"User not found: {sorted(missing)}")
+    overrides = {(plan.template_id, plan.user_id) for plan in bulk.plans if plan.template_id is not None}
+    templates = crud.get_plan_templates_by_id(db, [template_id for template_id, _ in overrides])
+    check_override_templates(templates, sorted(overrides), "meal")
+
+    try:
+        ids = crud.create_meal_plans_bulk(db, bulk.plans)
+    except Exception as e:
+        logger.error(f"Error bulk creating meal plans: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An unexpected error occurred while creating the meal plans"
+        )
+    logger.info(f"Created {len(ids)} meal plans for {len(user_ids)} users")
+    return {"ids": ids}
+
+@app.post("/plan-templates/", response_model=schemas.PlanTemplate)
+def create_plan_template(
+    template: schemas.PlanTemplateCreate,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Create a recurring workout or meal plan"""
+    # Same rules as creating a single plan of that kind
+    if template.kind == "workout":
+        if not current_user.is_admin:
+            raise HTTPException(status_code=403, detail="Not authorized to create workout plans")
+        if current_user.assigned_user_ids and template.user_id not in current_user.assigned_user_ids:
+            raise HTTPException(status_code=403, detail="Not authorized to create plans for this user")
+    elif template.user_id != current_user.id and not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You can only create meal plans for yourself unless you are an admin"
+        )
+    if not crud.get_existing_user_ids(db, [template.user_id]):
+        raise HTTPException(status_code=404, detail="User not found")
+
+    db_template = crud.create_plan_template(db, template)
+    logger.info(f"Created {template.kind} template {db_template.id} for user {template.user_id}")
+    return serialization.plan_template_payload(db_template)
+
+@app.get("/plan-templates/", response_model=List[schemas.PlanTemplate])
+def read_plan_templates(
+    kind: Optional[str] = Query(None, pattern="^(workout|meal)$"),
+    user_id: Optional[int] = Query(None, description="Admins only; defaults to the current user"),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """List recurring plan templates"""
+    if user_id is None:
+        user_id = current_user.id
+    elif user_id != current_user.id:
+        if not current_user.is_admin or (
+            current_user.assigned_user_ids and user_id not in current_user.assigned_user_ids
+        ):
+            raise HTTPException(status_code=403, detail="Not authorized to view these templates")
+    templates = crud.get_user_plan_templates(db, user_id, kind)
+    return [serialization.plan_template_payload(template) for template in templates]
+
+@app.get("/workout-plans/user", response_model=List[schemas.WorkoutPlan], response_class=ORJSONResponse, responses=PAGED_RESPONSES)
 def read_user_workout_plans(
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Follow the next cursor for more"),
+    cursor: Optional[str] = None,
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from", description="Earliest scheduled date (inclusive)"),
+    date_to: Optional[Union[datetime, date]] = Query(None, alias="to", description="Latest scheduled date (exclusive)"),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get workout plans for the current user"""
+    """Get workout plans for the current user, ordered by scheduled date"""
     try:
-        logger.info(f"Fetching workout plans for user {current_user.id}")
-        workout_plans = crud.get_user_workout_plans(db, user_id=current_user.id)
-        logger.info(f"Found {len(workout_plans)} workout plans")
-        
-        # Convert workout plans to schema objects
-        return [
-            schemas.WorkoutPlan(
-                id=plan.id,
-                title=plan.title,
-                description=plan.description,
-                scheduled_date=plan.scheduled_date,
-                exercises=plan.exercises,  # Already deserialized in crud function
-                user_id=plan.user_id,
-                created_at=plan.created_at
-            ) for plan in workout_plans
-        ]
-        
+        # Answer revalidations and repeat reads without reading any plans
+        version = crud.get_plan_version(db, current_user.id)
+        # Without a `to` date the expanded templates run ahead from today
+        horizon = recurrence.horizon_anchor() if date_to is None else None
+        plan_etag = etag.plan_feed_etag("workout-plans", current_user.id, version, request.url.query, horizon)
+        if etag.matches_if_none_match(request, plan_etag):
+            return etag.not_modified(plan_etag)
+        cache_key = ("workout-plans", current_user.id, version, request.url.query, horizon)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached.render(request)
+
+        # Stored plans and recurring template occurrences, paged together
+        page = crud.get_user_plan_feed(
+            db, models.WorkoutPlan, "workout", current_user.id, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to
+        )
+        logger.debug(f"Found {len(page.plans)} workout plans and {len(page.occurrences)} occurrences for user {current_user.id}")
+
+        # Serialized from the stored exercise JSON, skipping response_model validation
+        response = serialization.workout_plans_response(page.plans, page.occurrences)
+        headers = etag.etag_headers(plan_etag)
+        headers.update(next_page_headers(request, page.next_cursor))
+        cached = CachedResponse.build(response.body, headers)
+        response_cache.put(cache_key, cached)
+        return cached.render(request)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching workout plans: {str(e)}")
         logger.error(traceback.format_exc())
@@ -507,39 +641,47 @@ def read_user_workout_plans(
             detail=f"Error fetching workout plans: {str(e)}"
         )
 
-@app.get("/meal-plans/user", response_model=List[schemas.MealPlan])
+@app.get("/meal-plans/user", response_model=List[schemas.MealPlan], response_class=ORJSONResponse, responses=PAGED_RESPONSES)
 def read_user_meal_plans(
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Follow the next cursor for more"),
+    cursor: Optional[str] = None,
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from", description="Earliest scheduled date (inclusive)"),
+    date_to: Optional[Union[datetime, date]] = Query(None, alias="to", description="Latest scheduled date (exclusive)"),
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get meal plans for the current user"""
+    """Get meal plans for the current user, ordered by scheduled date"""
     try:
-        logger.info(f"Fetching meal plans for user {current_user.id}")
-        meal_plans = crud.get_user_meal_plans(db, user_id=current_user.id)
-        logger.info(f"Found {len(meal_plans)} meal plans")
-        
-        # Validate each meal plan before returning
-        validated_meal_plans = []
-        for meal_plan in meal_plans:
-            try:
-                # Convert to dict and validate through schema
-                meal_plan_dict = {
-                    "id": meal_plan.id,
-                    "title": meal_plan.title,
-                    "description": meal_plan.description,
-                    "scheduled_date": meal_plan.scheduled_date,
-                    "meals": meal_plan.meals,  # Already deserialized in crud function
-                    "user_id": meal_plan.user_id,
-                    "created_at": meal_plan.created_at
-                }
-                validated_meal_plan = schemas.MealPlan(**meal_plan_dict)
-                validated_meal_plans.append(validated_meal_plan)
-            except Exception as e:
-                logger.error(f"Error validating meal plan {meal_plan.id}: {str(e)}")
-                continue
-        
-        return validated_meal_plans
-        
+        # Answer revalidations and repeat reads without reading any plans
+        version = crud.get_plan_version(db, current_user.id)
+        # Without a `to` date the expanded templates run ahead from today
+        horizon = recurrence.horizon_anchor() if date_to is None else None
+        plan_etag = etag.plan_feed_etag("meal-plans", current_user.id, version, request.url.query, horizon)
+        if etag.matches_if_none_match(request, plan_etag):
+            return etag.not_modified(plan_etag)
+        cache_key = ("meal-plans", current_user.id, version, request.url.query, horizon)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached.render(request)
+
+        # Stored plans and recurring template occurrences, paged together
+        page = crud.get_user_plan_feed(
+            db, models.MealPlan, "meal", current_user.id, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to
+        )
+        logger.debug(f"Found {len(page.plans)} meal plans and {len(page.occurrences)} occurrences for user {current_user.id}")
+
+        # Plans that fail validation are logged and left out, as before
+        response = serialization.meal_plans_response(page.plans, page.occurrences)
+        headers = etag.etag_headers(plan_etag)
+        headers.update(next_page_headers(request, page.next_cursor))
+        cached = CachedResponse.build(response.body, headers)
+        response_cache.put(cache_key, cached)
+        return cached.render(request)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching meal plans: {str(e)}")
         logger.error(traceback.format_exc())
@@ -548,48 +690,247 @@ def read_user_meal_plans(
             detail=f"Error fetching meal plans: {str(e)}"
         )
 
-@app.get("/workout-plans/", response_model=List[schemas.WorkoutPlan])
+@app.get("/analytics/training-volume", response_model=schemas.TrainingProgression)
+def read_training_volume(
+    exercise: Optional[str] = Query(None, description="Limit to one exercise (case-insensitive)"),
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from"),
+    date_to: Optional[Union[datetime, date]] = Query(None, alias="to"),
+    user_id: Optional[int] = Query(None, description="Admins only; defaults to the current user"),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Weekly tonnage, volume and best weight per exercise, read from the rollup"""
+    if user_id is None:
+        user_id = current_user.id
+    elif user_id != current_user.id:
+        if not current_user.is_admin or (
+            current_user.assigned_user_ids and user_id not in current_user.assigned_user_ids
+        ):
+            raise HTTPException(status_code=403, detail="Not authorized to view this user's training volume")
+
+    rows = crud.get_training_volume(db, user_id, exercise, date_from, date_to)
+    exercises = []
+    totals = {}
+    for name, exercise_rows in groupby(rows, key=lambda row: row.exercise):
+        series = list(exercise_rows)
+        exercises.append({"exercise": name, "series": series})
+        for row in series:
+            total = totals.setdefault(row.period_start, {"period_start": row.period_start, "sets": 0, "reps": 0, "tonnage": 0.0})
+            total["sets"] += row.sets
+            total["reps"] += row.reps
+            total["tonnage"] += row.tonnage
+    return {"user_id": user_id, "exercises": exercises, "total": [totals[period] for period in sorted(totals)]}
+
+@app.get("/workout-plans/", response_model=List[schemas.WorkoutPlan], response_class=ORJSONResponse, responses=PAGED_RESPONSES)
 def read_workout_plans(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(get_current_user)
+    request: Request,
+    skip: int = Query(0, ge=0, description="Legacy offset paging; prefer cursor"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from", description="Earliest scheduled date (inclusive)"),
+    date_to: Optional[Union[datetime, date]] = Query(None, alias="to", description="Latest scheduled date (exclusive)"),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    with get_db() as db:
-        if current_user.is_admin:
-            workout_plans = crud.get_workout_plans(db, skip=skip, limit=limit)
-        else:
-            workout_plans = crud.get_user_workout_plans(db, user_id=current_user.id, skip=skip, limit=limit)
-        return workout_plans
-
-@app.get("/meal-plans/", response_model=List[schemas.MealPlan])
+    if current_user.is_admin:
+        page = crud.get_workout_plans(
+            db, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to
+        )
+    else:
+        page = crud.get_user_workout_plans(
+            db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to
+        )
+    response = serialization.workout_plans_response(page.items)
+    set_next_cursor(request, response, page)
+    return response
+
+@app.get("/export/plans")
+def export_plans(
+    export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+    kind: Optional[str] = Query(None, pattern="^(workout|meal)$", description="Omit for both"),
+    user_id: Optional[int] = Query(None, description="Admins only; omit for every assigned user"),
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from", description="Earliest scheduled date (inclusive)"),
+    date_to: Optional[Union[datetime, date]] = Query(None, alias="to", description="Latest scheduled date (exclusive)"),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """Stream the stored workout and meal plans of one user or an admin's roster"""
+    admin_id = None
+    if not current_user.is_admin:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to export these plans")
+        user_id = current_user.id
+    elif user_id is None:
+        admin_id = current_user.id
+    elif current_user.assigned_user_ids and user_id not in current_user.assigned_user_ids:
+        raise HTTPException(status_code=403, detail="Not authorized to export these plans")
+
+    return export.export_response(
+        export_format,
+        kinds=[kind] if kind else export.PLAN_KINDS,
+        user_id=user_id,
+        admin_id=admin_id,
+        date_from=date_from,
+        date_to=date_to
+    )
+
+@app.get("/meal-plans/summary", response_model=schemas.NutritionSummary, response_class=ORJSONResponse)
+def read_meal_plan_summary(
+    date_from: Union[datetime, date] = Query(..., alias="from", description="Start of the report (inclusive)"),
+    date_to: Union[datetime, date] = Query(..., alias="to", description="End of the report (exclusive)"),
+    granularity: str = Query("day", pattern="^(day|week)$"),
+    user_id: Optional[int] = Query(None, description="Admins only; omit for every assigned user"),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Daily or weekly macro totals and averages for one user or an admin's roster"""
+    if not current_user.is_admin:
+        if user_id is not None and user_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to view this summary")
+        user_ids = {current_user.id}
+    elif user_id is None:
+        user_ids = set(current_user.assigned_user_ids)
+    else:
+        if current_user.assigned_user_ids and user_id not in current_user.assigned_user_ids:
+            raise HTTPException(status_code=403, detail="Not authorized to view this summary")
+        user_ids = {user_id}
+
+    columns = nutrition.MealColumns()
+    if user_ids:
+        columns.add_rows(crud.get_meal_macro_rows(db, user_ids, date_from, date_to))
+        columns.add_occurrences(
+            crud.get_plan_occurrences(db, models.MealPlan, "meal", user_ids, date_from, date_to)
+        )
+    return ORJSONResponse({
+        "granularity": granularity,
+        "date_from": crud.to_naive_utc(date_from),
+        "date_to": crud.to_naive_utc(date_to),
+        "users": nutrition.summarize_meals(user_ids, columns, granularity),
+    })
+
+@app.get("/meal-plans/", response_model=List[schemas.MealPlan], response_class=ORJSONResponse, responses=PAGED_RESPONSES)
 def read_meal_plans(
-    skip: int = 0,
-    limit: int = 100,
-    current_user: models.User = Depends(get_current_user)
+    request: Request,
+    skip: int = Query(0, ge=0, description="Legacy offset paging; prefer cursor"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from", description="Earliest scheduled date (inclusive)"),
+    date_to: Optional[Union[datetime, date]] = Query(None, alias="to", description="Latest scheduled date (exclusive)"),
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.is_admin:
+        page = crud.get_meal_plans(
+            db, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to
+        )
+    else:
+        page = crud.get_user_meal_plans(
+            db, user_id=current_user.id, skip=skip, limit=limit, cursor=cursor,
+            date_from=date_from, date_to=date_to
+        )
+    response = serialization.meal_plans_response(page.items)
+    set_next_cursor(request, response, page)
+    return response
+
+@app.get("/admin/roster", response_model=List[schemas.RosterEntry], responses=PAGED_RESPONSES)
+def read_roster(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: Session = Depends(get_db)
 ):
-    with get_db() as db:
-        if current_user.is_admin:
-            meal_plans = crud.get_meal_plans(db, skip=skip, limit=limit)
-        else:
-            meal_plans = crud.get_user_meal_plans(db, user_id=current_user.id, skip=skip, limit=limit)
-        return meal_plans
-
-@app.get("/users/assigned", response_model=List[schemas.User])
+    """Assigned users with their next workout and meal plan and the coming week's load"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view the roster")
+    page = crud.get_users(db, limit=limit, admin_id=current_user.id, cursor=cursor)
+    set_next_cursor(request, response, page)
+    return roster.build_roster(db, page.items, datetime.utcnow())
+
+@app.get("/users/assigned", response_model=List[schemas.User], responses=PAGED_RESPONSES)
 def read_assigned_users(
-    current_user: models.User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Omit for every assigned user"),
+    cursor: Optional[str] = None,
+    current_user: UserSnapshot = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all users assigned to the current admin"""
-    try:
-        if not current_user.is_admin:
-            raise HTTPException(status_code=403, detail="Not authorized to view assigned users")
-        
-        users = crud.get_admin_users(db, admin_id=current_user.id)
-        if users is None:
-            return []
-        return users
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error fetching assigned users: {str(e)}"
-        ) 
\ No newline at end of file
+    """Get the users assigned to the current admin"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view assigned users")
+    page = crud.get_admin_users(db, admin_id=current_user.id, limit=limit, cursor=cursor)
+    set_next_cursor(request, response, page)
+    return page.items
+
+@app.get("/internal/pool-stats")
+def read_pool_stats(current_user: UserSnapshot = Depends(get_current_user)):
+    """Connection pool checkout, overflow and wait-time statistics"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view pool statistics")
+    return pool_stats()
+
+def _stats_samples():
+    """Pool, cache and hashing statistics as gauges and counters for /metrics"""
+    samples = []
+    for engine_name, stats in pool_stats().items():
+        samples += metrics.stats_samples(
+            "db_pool", "SQLAlchemy connection pool", stats,
+            counters=("checkouts", "checkins", "connects", "invalidations", "timeouts", "wait_seconds_total"),
+            labels=(("engine", engine_name),)
+        )
+    samples += metrics.stats_samples(
+        "identity_cache", "Authenticated user cache", identity_cache.stats(), counters=("hits", "misses", "evictions")
+    )
+    samples += metrics.stats_samples(
+        "response_cache", "Serialized plan response cache", response_cache.stats(), counters=("hits", "misses", "evictions")
+    )
+    samples.append((
+        "password_hash_rejected_total", "counter", "Hash requests turned away because the hashing queue was full",
+        (), hashing.stats.snapshot()["rejected"]
+    ))
+    return samples
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics(request: Request):
+    """Prometheus scrape endpoint for this worker process"""
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return Response(metrics.registry.render(_stats_samples()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/internal/slow-queries")
+def read_slow_queries(current_user: UserSnapshot = Depends(get_current_user)):
+    """Slow statements seen by this worker, grouped by fingerprint, most total time first"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view slow queries")
+    return slow_query.slow_query_log.entries()
+
+@app.get("/internal/profiles")
+def read_profiles(current_user: UserSnapshot = Depends(get_current_user)):
+    """Sampled request profiles held by this worker, newest first"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view profiles")
+    return [profile.summary() for profile in profiling.profile_store.list()]
+
+@app.get("/internal/profiles/{profile_id}")
+def download_profile(
+    profile_id: str,
+    format: str = Query("folded", pattern="^(folded|json)$"),
+    current_user: UserSnapshot = Depends(get_current_user)
+):
+    """A sampled profile as collapsed stacks (for flamegraph tools) or as JSON with its SQL statements"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Not authorized to view profiles")
+    profile = profiling.profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "json":
+        return ORJSONResponse({**profile.summary(), "statements": profile.statements, "stacks": profile.stacks})
+    return Response(
+        content=profile.stacks or "",
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
@@ -0,0 +1,198 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Every thread writes to its own shard, so recording a sample is a couple of
+dict operations with no lock; shards are only summed when /metrics is
+scraped. Values are per worker process, as Prometheus expects of a target.
+"""
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+import os
+import threading
+import time
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Upper bounds, in seconds, of the latency histogram buckets
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.15, 0.25, 0.5, 1.0, 2.0, 5.0)
+
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Route label for requests that matched no route, to keep label values bounded
+UNMATCHED_ROUTE = "<unmatched>"
+
+class _Shard:
+    __slots__ = ("counters", "histograms")
+
+    def __init__(self):
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> per-bucket counts followed by the sum
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+
+class MetricsRegistry:
+    """Counters, up/down gauges and histograms kept in per-thread shards"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._buckets: Dict[str, Sequence[float]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Sequence[float] = ()) -> None:
+        self._help[name] = (kind, help_text)
+        if kind == "histogram":
+            self._buckets[name] = buckets
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = _Shard()
+            # Only taken once per thread; shards outlive their threads so counts are kept
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1.0) -> None:
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        histograms = self._shard().histograms
+        key = (name, labels)
+        buckets = self._buckets[name]
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0.0] * (len(buckets) + 2)
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def _collect(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        counters: Dict[Tuple[str, Labels], float] = {}
+        histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        for shard in shards:
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0.0) + value
+            for key, counts in list(shard.histograms.items()):
+                total = histograms.setdefault(key, [0.0] * len(counts))
+                for index, count in enumerate(list(counts)):
+                    total[index] += count
+        return counters, histograms
+
+    def render(self, extra: Iterable[Tuple[str, str, str, Labels, float]] = ()) -> str:
+        """
+        Exposition text for everything recorded, plus extra (name, kind,
+        help, labels, value) samples read from other modules' stats.
+        """
+        counters, histograms = self._collect()
+        samples: Dict[str, List[str]] = {}
+        kinds = {name: kind for name, (kind, _) in self._help.items()}
+        helps = {name: help_text for name, (_, help_text) in self._help.items()}
+
+        for (name, labels), value in sorted(counters.items()):
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), counts in sorted(histograms.items()):
+            lines = samples.setdefault(name, [])
+            cumulative = 0.0
+            for bound, count in zip(self._buckets[name], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {_number(cumulative)}")
+            cumulative += counts[-2]
+            lines.append(f"{name}_bucket{_labels(labels + (('le', '+Inf'),))} {_number(cumulative)}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(counts[-1])}")
+            lines.append(f"{name}_count{_labels(labels)} {_number(cumulative)}")
+        for name, kind, help_text, labels, value in extra:
+            kinds.setdefault(name, kind)
+            helps.setdefault(name, help_text)
+            samples.setdefault(name, []).append(f"{name}{_labels(labels)} {_number(value)}")
+
+        output = []
+        for name in sorted(samples):
+            output.append(f"# HELP {name} {helps.get(name, name)}")
+            output.append(f"# TYPE {name} {kinds.get(name, 'untyped')}")
+            output.extend(samples[name])
+        return "\n".join(output) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels) + "}"
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+registry = MetricsRegistry()
+registry.describe("http_requests_total", "counter", "HTTP requests by method, route template and status")
+registry.describe("http_request_duration_seconds", "histogram", "HTTP request latency by method and route template",
+                  REQUEST_BUCKETS)
+registry.describe("http_requests_in_flight", "gauge", "HTTP requests currently being served")
+registry.describe("password_hash_duration_seconds", "histogram", "bcrypt hash and verify time on the hashing executor",
+                  HASH_BUCKETS)
+registry.describe("jwt_decode_failures_total", "counter", "Bearer tokens that failed to decode, by reason")
+registry.describe("exception_handler_total", "counter", "Responses produced by the app's exception handlers")
+
+def inc(name: str, labels: Labels = (), value: float = 1.0) -> None:
+    registry.inc(name, labels, value)
+
+def observe(name: str, labels: Labels, value: float) -> None:
+    registry.observe(name, labels, value)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware counting and timing requests by route template"""
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.registry.inc("http_requests_in_flight")
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.registry.inc("http_requests_in_flight", value=-1)
+            # The router leaves the matched route in the scope; its template
+            # keeps the label set bounded however many ids appear in paths
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            method = scope["method"]
+            self.registry.inc("http_requests_total", (("method", method), ("route", route_path), ("status", str(status_code))))
+            self.registry.observe(
+                "http_request_duration_seconds", (("method", method), ("route", route_path)),
+                time.perf_counter() - started
+            )
+
+def stats_samples(prefix: str, help_text: str, stats: Dict[str, float], counters: Sequence[str],
+                  labels: Labels = ()) -> List[Tuple[str, str, str, Labels, float]]:
+    """Turn a stats() dict into render() samples; keys in counters are counters, the rest gauges"""
+    samples = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        kind = "counter" if key in counters else "gauge"
+        name = f"{prefix}_{key}"
+        if kind == "counter" and not name.endswith("_total"):
+            name += "_total"
+        samples.append((name, kind, f"{help_text} ({key})", labels, value))
+    return samples
@@ -0,0 +1,201 @@
+"""
+Idempotent schema and data migrations run at startup (or by hand).
+
+Base.metadata.create_all() only creates missing tables, so anything that
+changes an existing table or backfills data lives here.
+
+Usage:
+    python migrations.py
+"""
+from sqlalchemy import MetaData, insert, inspect, select, exists, and_, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+from database import engine
+from itertools import groupby
+import models
+import training_volume
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = 500
+
+def _exercise_row(plan_id: int, position: int, exercise: dict) -> dict:
+    return {
+        "plan_id": plan_id,
+        "position": position,
+        "name": exercise["name"],
+        "sets": int(exercise["sets"]),
+        "reps": int(exercise["reps"]),
+        "weight": float(exercise["weight"]),
+    }
+
+def _meal_row(plan_id: int, position: int, meal: dict) -> dict:
+    return {
+        "plan_id": plan_id,
+        "position": position,
+        "name": meal["name"],
+        "time": meal.get("time"),
+        "calories": int(meal["calories"]),
+        "protein": float(meal["protein"]),
+        "carbs": float(meal["carbs"]),
+        "fats": float(meal["fats"]),
+        "ingredients": meal.get("ingredients"),
+    }
+
+def _backfill_children(db_engine: Engine, plan_table, json_column, child_table, build_row, batch_size: int) -> int:
+    """Copy JSON items into child rows for plans that have none yet, one batch per transaction"""
+    missing_children = ~exists().where(child_table.c.plan_id == plan_table.c.id)
+    last_id = 0
+    migrated = 0
+    while True:
+        with db_engine.begin() as connection:
+            plans = connection.execute(
+                select(plan_table.c.id, json_column)
+                .where(and_(plan_table.c.id > last_id, json_column.isnot(None), missing_children))
+                .order_by(plan_table.c.id)
+                .limit(batch_size)
+            ).all()
+            if not plans:
+                return migrated
+
+            rows = []
+            for plan_id, items_json in plans:
+                try:
+                    items = json.loads(items_json) if items_json else []
+                    rows.extend(build_row(plan_id, position, item) for position, item in enumerate(items))
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error(f"Skipping {plan_table.name} {plan_id} with malformed JSON: {str(e)}")
+            if rows:
+                connection.execute(insert(child_table), rows)
+            migrated += len(plans)
+            last_id = plans[-1][0]
+
+def backfill_plan_children(db_engine: Engine = engine, batch_size: int = BACKFILL_BATCH_SIZE) -> None:
+    """Populate workout_exercises and plan_meals from the legacy JSON columns"""
+    workout_plans = models.WorkoutPlan.__table__
+    meal_plans = models.MealPlan.__table__
+    migrated = _backfill_children(
+        db_engine, workout_plans, workout_plans.c.exercises,
+        models.WorkoutExercise.__table__, _exercise_row, batch_size
+    )
+    if migrated:
+        logger.info(f"Backfilled exercises for {migrated} workout plans")
+    migrated = _backfill_children(
+        db_engine, meal_plans, meal_plans.c.meals,
+        models.PlanMeal.__table__, _meal_row, batch_size
+    )
+    if migrated:
+        logger.info(f"Backfilled meals for {migrated} meal plans")
+
+def backfill_training_volume(db_engine: Engine = engine, batch_size: int = BACKFILL_BATCH_SIZE) -> None:
+    """Build the training volume rollup from existing exercise rows if it has never been built"""
+    volume = models.TrainingVolume.__table__
+    plans = models.WorkoutPlan.__table__
+    exercises = models.WorkoutExercise.__table__
+    with db_engine.connect() as connection:
+        if connection.execute(select(volume.c.user_id).limit(1)).first() is not None:
+            return
+        if connection.execute(select(exercises.c.id).limit(1)).first() is None:
+            return
+
+    deltas = {}
+    last_id = 0
+    with db_engine.connect() as connection:
+        while True:
+            rows = connection.execute(
+                select(plans.c.id, plans.c.user_id, plans.c.scheduled_date,
+                       exercises.c.name, exercises.c.sets, exercises.c.reps, exercises.c.weight)
+                .select_from(exercises.join(plans, exercises.c.plan_id == plans.c.id))
+                .where(plans.c.id.in_(
+                    select(plans.c.id).where(plans.c.id > last_id).order_by(plans.c.id).limit(batch_size).scalar_subquery()
+                ))
+                .order_by(plans.c.id, exercises.c.position)
+            ).all()
+            if not rows:
+                break
+            training_volume.volume_deltas(
+                ((user_id, scheduled_date, list(plan_rows))
+                 for (_, user_id, scheduled_date), plan_rows in groupby(rows, key=lambda row: row[:3])),
+                deltas
+            )
+            last_id = rows[-1].id
+    with db_engine.begin() as connection:
+        training_volume.apply_volume_deltas(connection, deltas)
+    logger.info(f"Built {len(deltas)} training volume rollup rows")
+
+def ensure_columns(db_engine: Engine = engine) -> None:
+    """Add nullable columns declared on the models that an existing table is missing"""
+    inspector = inspect(db_engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+            # Column DDL only; foreign keys on added columns are left to the ORM
+            column_ddl = CreateColumn(column).compile(dialect=db_engine.dialect)
+            with db_engine.begin() as connection:
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}")
+            logger.info(f"Added column {table.name}.{column.name}")
+
+def ensure_assignment_primary_key(db_engine: Engine = engine) -> None:
+    """
+    Rebuild admin_users with its (admin_id, user_id) primary key.
+
+    Older databases created the table without one, so duplicate pairs could
+    accumulate and every lookup scanned the table. SQLite cannot add a
+    primary key in place, so the pairs are copied once, deduplicated, into
+    a new table that then replaces the old one.
+    """
+    table = models.admin_user_association
+    inspector = inspect(db_engine)
+    if table.name not in inspector.get_table_names():
+        return
+    if inspector.get_pk_constraint(table.name)["constrained_columns"]:
+        return
+
+    # The copy's foreign keys need users in the same metadata to compile
+    metadata = MetaData()
+    models.User.__table__.to_metadata(metadata)
+    rebuilt = table.to_metadata(metadata, name=f"{table.name}_rebuild")
+    # Indexes keep their names; ensure_indexes creates them on the final table
+    rebuilt.indexes.clear()
+
+    with db_engine.begin() as connection:
+        before = connection.execute(select(func.count()).select_from(table)).scalar()
+        rebuilt.create(connection)
+        connection.execute(insert(rebuilt).from_select(
+            ["admin_id", "user_id"],
+            select(table.c.admin_id, table.c.user_id)
+            .where(and_(table.c.admin_id.isnot(None), table.c.user_id.isnot(None)))
+            .distinct()
+        ))
+        after = connection.execute(select(func.count()).select_from(rebuilt)).scalar()
+        connection.exec_driver_sql(f"DROP TABLE {table.name}")
+        connection.exec_driver_sql(f"ALTER TABLE {rebuilt.name} RENAME TO {table.name}")
+    logger.info(f"Rebuilt {table.name} with a primary key ({before - after} duplicate or empty rows dropped)")
+
+def ensure_indexes(db_engine: Engine = engine) -> None:
+    """Create any index declared on the models that an existing table is missing"""
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db_engine, checkfirst=True)
+
+def run_migrations(db_engine: Engine = engine) -> None:
+    ensure_columns(db_engine)
+    ensure_assignment_primary_key(db_engine)
+    ensure_indexes(db_engine)
+    backfill_plan_children(db_engine)
+    backfill_training_volume(db_engine)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations()
+    print("Migrations complete")
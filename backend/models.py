@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, Table
+from sqlalchemy import Boolean, Column, Date, ForeignKey, Integer, String, Text, DateTime, Table, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -7,8 +7,10 @@ from datetime import datetime
 admin_user_association = Table(
     'admin_users',
     Base.metadata,
-    Column('admin_id', Integer, ForeignKey('users.id')),
-    Column('user_id', Integer, ForeignKey('users.id'))
+    Column('admin_id', Integer, ForeignKey('users.id'), primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), primary_key=True),
+    # The primary key serves admin -> users; this serves user -> admins
+    Index('ix_admin_users_user_id_admin_id', 'user_id', 'admin_id')
 )
 
 class User(Base):
@@ -20,6 +22,8 @@ class User(Base):
     full_name = Column(String)
     is_admin = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped whenever the user's workout/meal plans change; drives plan feed ETags
+    plan_version = Column(Integer, nullable=True, default=0, server_default="0")
     
     workout_plans = relationship("WorkoutPlan", back_populates="user")
     meal_plans = relationship("MealPlan", back_populates="user")
@@ -35,26 +39,131 @@ class User(Base):
 
 class WorkoutPlan(Base):
     __tablename__ = "workout_plans"
+    __table_args__ = (
+        # Serves per-user calendar windows with a single index range scan
+        Index("ix_workout_plans_user_id_scheduled_date", "user_id", "scheduled_date"),
+        Index("ix_workout_plans_template_id_occurrence_date", "template_id", "occurrence_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(Text)
-    exercises = Column(Text)  # JSON string of exercises
+    exercises_json = Column("exercises", Text)  # Served by plan reads; mirrored as exercise rows for analytics
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     scheduled_date = Column(DateTime)
+    # Set when this plan overrides one occurrence of a recurring template
+    template_id = Column(Integer, ForeignKey("plan_templates.id"), nullable=True)
+    occurrence_date = Column(DateTime, nullable=True)
     
     user = relationship("User", back_populates="workout_plans")
+    exercises = relationship(
+        "WorkoutExercise",
+        back_populates="plan",
+        order_by="WorkoutExercise.position",
+        cascade="all, delete-orphan"
+    )
+
+class WorkoutExercise(Base):
+    __tablename__ = "workout_exercises"
+    __table_args__ = (
+        Index("ix_workout_exercises_plan_id_position", "plan_id", "position"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    plan_id = Column(Integer, ForeignKey("workout_plans.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    name = Column(String, nullable=False, index=True)
+    sets = Column(Integer, nullable=False)
+    reps = Column(Integer, nullable=False)
+    weight = Column(Float, nullable=False)
+
+    plan = relationship("WorkoutPlan", back_populates="exercises")
 
 class MealPlan(Base):
     __tablename__ = "meal_plans"
+    __table_args__ = (
+        # Serves per-user calendar windows with a single index range scan
+        Index("ix_meal_plans_user_id_scheduled_date", "user_id", "scheduled_date"),
+        Index("ix_meal_plans_template_id_occurrence_date", "template_id", "occurrence_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     description = Column(Text)
-    meals = Column(Text)  # JSON string of meals
+    meals_json = Column("meals", Text)  # Served by plan reads; mirrored as meal rows for analytics
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     scheduled_date = Column(DateTime)
+    # Set when this plan overrides one occurrence of a recurring template
+    template_id = Column(Integer, ForeignKey("plan_templates.id"), nullable=True)
+    occurrence_date = Column(DateTime, nullable=True)
     
-    user = relationship("User", back_populates="meal_plans") 
\ No newline at end of file
+    user = relationship("User", back_populates="meal_plans")
+    meals = relationship(
+        "PlanMeal",
+        back_populates="plan",
+        order_by="PlanMeal.position",
+        cascade="all, delete-orphan"
+    )
+
+class PlanMeal(Base):
+    __tablename__ = "plan_meals"
+    __table_args__ = (
+        Index("ix_plan_meals_plan_id_position", "plan_id", "position"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    plan_id = Column(Integer, ForeignKey("meal_plans.id", ondelete="CASCADE"), nullable=False)
+    position = Column(Integer, nullable=False)
+    name = Column(String, nullable=False)
+    time = Column(String)
+    calories = Column(Integer, nullable=False)
+    protein = Column(Float, nullable=False)
+    carbs = Column(Float, nullable=False)
+    fats = Column(Float, nullable=False)
+    ingredients = Column(Text)
+
+    plan = relationship("MealPlan", back_populates="meals") 
+
+class PlanTemplate(Base):
+    """
+    A recurring workout or meal plan, expanded into occurrences at read time.
+
+    The plan repeats on the given weekdays (0=Monday) of every interval_weeks-th
+    week counted from start_date, at start_date's time of day, up to and
+    including until_date. Only occurrences that were changed are stored, as
+    WorkoutPlan/MealPlan rows pointing back here via template_id.
+    """
+    __tablename__ = "plan_templates"
+    __table_args__ = (
+        Index("ix_plan_templates_user_id_kind", "user_id", "kind"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)  # "workout" or "meal"
+    title = Column(String, nullable=False)
+    description = Column(Text)
+    items_json = Column("items", Text, nullable=False)  # exercises or meals, as stored on plans
+    start_date = Column(DateTime, nullable=False)
+    until_date = Column(DateTime, nullable=True)
+    weekdays = Column(String, nullable=False)  # comma separated, e.g. "0,2,4"
+    interval_weeks = Column(Integer, nullable=False, default=1)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class TrainingVolume(Base):
+    """
+    Weekly training volume per user and exercise, maintained incrementally
+    as workout plans are written (see training_volume.py).
+    """
+    __tablename__ = "training_volume"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    exercise = Column(String, primary_key=True)  # stripped, lower-cased exercise name
+    period_start = Column(Date, primary_key=True)  # Monday of the plan's scheduled week
+    sets = Column(Integer, nullable=False, default=0)
+    reps = Column(Integer, nullable=False, default=0)  # sets x reps, summed
+    tonnage = Column(Float, nullable=False, default=0)  # sets x reps x weight, summed
+    best_weight = Column(Float, nullable=False, default=0)
+    plans = Column(Integer, nullable=False, default=0)
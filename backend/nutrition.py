@@ -0,0 +1,112 @@
+"""
+Batched macro totals over meal plans.
+
+Meals are loaded as flat columns in one query and grouped by (user, period)
+with NumPy, so a trainer's whole-roster report costs one pass over the
+meals rather than a loop per user and day.
+"""
+from datetime import datetime
+from typing import Collection, Dict, List, Sequence
+import json
+
+import numpy as np
+
+from recurrence import Occurrence
+
+MACROS = ("calories", "protein", "carbs", "fats")
+
+class MealColumns:
+    """Column-wise meal data: owning user, plan, scheduled date and the four macros"""
+
+    def __init__(self):
+        self.user_ids: List[int] = []
+        self.plan_ids: List[int] = []
+        self.dates: List[datetime] = []
+        self.macros: List[Sequence[float]] = []
+
+    def add_rows(self, rows) -> None:
+        """Rows of (user_id, plan_id, scheduled_date, calories, protein, carbs, fats)"""
+        for user_id, plan_id, scheduled_date, *macros in rows:
+            self.user_ids.append(user_id)
+            self.plan_ids.append(plan_id)
+            self.dates.append(scheduled_date)
+            self.macros.append(macros)
+
+    def add_occurrences(self, occurrences: Sequence[Occurrence]) -> None:
+        """Meals of unstored template occurrences; each gets a distinct negative plan id"""
+        template_macros: Dict[int, List[List[float]]] = {}
+        for index, occurrence in enumerate(occurrences):
+            template = occurrence.template
+            if template.id not in template_macros:
+                template_macros[template.id] = [
+                    [meal[macro] for macro in MACROS] for meal in json.loads(template.items_json)
+                ]
+            for macros in template_macros[template.id]:
+                self.user_ids.append(template.user_id)
+                self.plan_ids.append(-(index + 1))
+                self.dates.append(occurrence.scheduled_date)
+                self.macros.append(macros)
+
+def _period_starts(days: np.ndarray, granularity: str) -> np.ndarray:
+    if granularity == "week":
+        # Day 0 (1970-01-01) was a Thursday; step back to each week's Monday
+        offsets = (days.astype(np.int64) + 3) % 7
+        return days - offsets.astype("timedelta64[D]")
+    return days
+
+def _macro_dict(values: np.ndarray) -> Dict[str, float]:
+    return {macro: round(value, 2) for macro, value in zip(MACROS, values.tolist())}
+
+def _count_distinct(group_pos: np.ndarray, values: np.ndarray, n_groups: int) -> np.ndarray:
+    """Number of distinct values per group"""
+    pairs = np.unique(np.stack([group_pos, values]), axis=1)
+    return np.bincount(pairs[0], minlength=n_groups)
+
+def summarize_meals(user_ids: Collection[int], columns: MealColumns, granularity: str) -> List[dict]:
+    """Per-user, per-period totals and averages of the meal macros"""
+    users = np.array(sorted(set(user_ids)), dtype=np.int64)
+    summaries = [
+        {"user_id": int(user_id), "periods": [], "totals": _macro_dict(np.zeros(len(MACROS))),
+         "period_average": _macro_dict(np.zeros(len(MACROS)))}
+        for user_id in users
+    ]
+    if not columns.user_ids:
+        return summaries
+
+    days = np.array(columns.dates, dtype="datetime64[D]")
+    macros = np.array(columns.macros, dtype=np.float64)
+    user_pos = np.searchsorted(users, np.array(columns.user_ids, dtype=np.int64))
+
+    # One group per (user, period)
+    period_values, period_pos = np.unique(_period_starts(days, granularity), return_inverse=True)
+    groups, group_pos = np.unique(user_pos * len(period_values) + period_pos.reshape(-1), return_inverse=True)
+    group_pos = group_pos.reshape(-1)
+    n_groups = len(groups)
+
+    totals = np.zeros((n_groups, len(MACROS)))
+    np.add.at(totals, group_pos, macros)
+    meal_counts = np.bincount(group_pos, minlength=n_groups)
+    plan_counts = _count_distinct(group_pos, np.array(columns.plan_ids, dtype=np.int64), n_groups)
+    day_counts = _count_distinct(group_pos, days.astype(np.int64), n_groups)
+    daily_average = totals / day_counts[:, None]
+
+    group_users = groups // len(period_values)
+    group_periods = period_values[groups % len(period_values)]
+    user_totals = np.zeros((len(users), len(MACROS)))
+    np.add.at(user_totals, group_users, totals)
+    user_period_counts = np.bincount(group_users, minlength=len(users))
+
+    for index in range(n_groups):
+        summaries[group_users[index]]["periods"].append({
+            "period_start": str(group_periods[index]),
+            "plans": int(plan_counts[index]),
+            "meals": int(meal_counts[index]),
+            "days": int(day_counts[index]),
+            "totals": _macro_dict(totals[index]),
+            "daily_average": _macro_dict(daily_average[index]),
+        })
+    for position, summary in enumerate(summaries):
+        if user_period_counts[position]:
+            summary["totals"] = _macro_dict(user_totals[position])
+            summary["period_average"] = _macro_dict(user_totals[position] / user_period_counts[position])
+    return summaries
@@ -0,0 +1,92 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, and_, false, or_, tuple_
+from sqlalchemy.orm import Query
+from typing import Any, List, NamedTuple, Optional, Sequence
+import json
+
+class Page(NamedTuple):
+    """One page of results plus the opaque cursor for the next page, if any"""
+    items: List[Any]
+    next_cursor: Optional[str]
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, columns: Sequence) -> List[Any]:
+    """Decode a cursor produced by encode_cursor for the given ordering columns"""
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError("cursor does not match the ordering")
+        return [
+            datetime.fromisoformat(value) if isinstance(column.type, DateTime) and value is not None else value
+            for column, value in zip(columns, values)
+        ]
+    except (ValueError, TypeError):
+        raise invalid_cursor()
+
+def invalid_cursor() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Invalid cursor"
+    )
+
+def _nullable(column) -> bool:
+    return bool(getattr(column, "nullable", False))
+
+def after_cursor(columns: Sequence, values: Sequence[Any]):
+    """Rows strictly after values in the ordering of columns, with NULLs sorting last"""
+    if not any(_nullable(column) for column in columns):
+        return tuple_(*columns) > tuple_(*values)
+    # A row comparison is never true against NULL, so spell the ordering out
+    column, value = columns[0], values[0]
+    if value is None:
+        greater = false()
+        equal = column.is_(None)
+    else:
+        greater = or_(column > value, column.is_(None)) if _nullable(column) else column > value
+        equal = column == value
+    if len(columns) == 1:
+        return greater
+    return or_(greater, and_(equal, after_cursor(columns[1:], values[1:])))
+
+def keyset_paginate(
+    query: Query,
+    columns: Sequence,
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+    skip: int = 0,
+    row_keys: Optional[Sequence[str]] = None
+) -> Page:
+    """
+    Order query by columns and return the page after cursor.
+
+    The last column must be unique (the primary key) so the ordering is
+    stable. skip is the legacy offset mode and is ignored once a cursor is
+    given. A limit of None returns every remaining row. row_keys names the
+    row attributes holding the columns' values when they differ from the
+    column keys, e.g. when ordering by a joined table's copy of the key.
+    Nullable columns sort NULLs last on every backend, as PostgreSQL
+    already does for ascending order.
+    """
+    query = query.order_by(*(column.asc().nulls_last() if _nullable(column) else column for column in columns))
+    if cursor:
+        query = query.filter(after_cursor(columns, decode_cursor(cursor, columns)))
+    elif skip:
+        query = query.offset(skip)
+
+    if limit is None:
+        return Page(query.all(), None)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    last = rows[-1]
+    keys = row_keys or [column.key for column in columns]
+    return Page(rows, encode_cursor([getattr(last, key) for key in keys]))
@@ -0,0 +1,262 @@
+"""
+Opt-in per-request profiling.
+
+With PROFILING_ENABLED=1 and a PROFILING_SECRET set, a request carrying a
+valid signed X-Profile header is timed phase by phase. SQL statements
+are counted and timed through engine cursor events, and the breakdown
+comes back in a Server-Timing header. Adding X-Profile-Sample: 1 also runs
+a sampling profiler for the request and keeps the collapsed stacks for
+download from /internal/profiles/{id} (flamegraph.pl / speedscope format).
+
+Generate a header value with:
+    python profiling.py GET /workout-plans/user
+"""
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import Headers, MutableHeaders
+from typing import Dict, List, Optional
+import hashlib
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Profiling configuration
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes") and bool(PROFILING_SECRET)
+# How long a signed header stays valid, in seconds
+PROFILING_SIGNATURE_TTL = int(os.getenv("PROFILING_SIGNATURE_TTL", "300"))
+PROFILING_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILING_SAMPLE_INTERVAL_MS", "2"))
+PROFILING_MAX_STORED = int(os.getenv("PROFILING_MAX_STORED", "20"))
+# Statements kept per profile for the download; all are counted and timed
+PROFILING_MAX_STATEMENTS = 200
+
+if os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes") and not PROFILING_SECRET:
+    logger.warning("PROFILING_ENABLED is set without PROFILING_SECRET; profiling stays off")
+
+# Phases reported in Server-Timing, in order
+PHASES = ("db", "serialize", "auth")
+
+def sign(method: str, path: str, timestamp: Optional[int] = None, secret: str = PROFILING_SECRET) -> str:
+    """X-Profile header value authorizing a profile of one method and path"""
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f"{timestamp}:{method.upper()}:{path}".encode(), hashlib.sha256)
+    return f"{timestamp}:{digest.hexdigest()}"
+
+def verify(header: str, method: str, path: str) -> bool:
+    timestamp, _, _ = header.partition(":")
+    try:
+        age = time.time() - int(timestamp)
+    except ValueError:
+        return False
+    if not -60 <= age <= PROFILING_SIGNATURE_TTL:
+        return False
+    return hmac.compare_digest(header, sign(method, path, int(timestamp)))
+
+class RequestProfile:
+    """Phase durations and SQL statements of one profiled request"""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex
+        self.method = method
+        self.path = path
+        self.created_at = datetime.utcnow()
+        self.started = time.perf_counter()
+        self.durations: Dict[str, float] = {}
+        self.query_count = 0
+        self.statements: List[dict] = []
+        self.total: Optional[float] = None
+        self.stacks: Optional[str] = None
+        self.samples = 0
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.durations[phase] = self.durations.get(phase, 0.0) + seconds
+
+    def add_query(self, statement: str, seconds: float) -> None:
+        self.query_count += 1
+        self.add("db", seconds)
+        if len(self.statements) < PROFILING_MAX_STATEMENTS:
+            self.statements.append({"statement": statement, "ms": round(seconds * 1000, 3)})
+
+    def server_timing(self) -> str:
+        entries = []
+        for phase in PHASES:
+            entry = f"{phase};dur={self.durations.get(phase, 0.0) * 1000:.2f}"
+            if phase == "db":
+                entry += f';desc="{self.query_count} quer{"y" if self.query_count == 1 else "ies"}"'
+            entries.append(entry)
+        entries.append(f"total;dur={(self.total or 0.0) * 1000:.2f}")
+        return ", ".join(entries)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "created_at": self.created_at,
+            "total_ms": round((self.total or 0.0) * 1000, 3),
+            "phases_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.durations.items()},
+            "query_count": self.query_count,
+            "samples": self.samples,
+        }
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+@contextmanager
+def phase(name: str):
+    """Attribute the enclosed time to a phase of the current profile, if any"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("profiling_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = conn.info.get("profiling_started")
+    if profile is not None and started:
+        profile.add_query(statement, time.perf_counter() - started.pop())
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time the engine's statements for profiled requests (pass async_engine.sync_engine for asyncio)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+# Leaf frames in these modules are threads waiting for work, not doing it
+_IDLE_MODULES = ("threading.py", "selectors.py", "queue.py")
+
+def _collapse(frame) -> Optional[str]:
+    if frame.f_code.co_filename.endswith(_IDLE_MODULES):
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StackSampler:
+    """
+    Background thread recording every busy thread's stack at a fixed interval.
+
+    Threads in the worker process are not told apart by request, so profile
+    under light load for a clean picture.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiling-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = _collapse(frame)
+                if stack:
+                    self.counts[stack] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        """Stop sampling and return the stacks in collapsed (folded) format"""
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+class ProfileStore:
+    """The most recent sampled profiles, kept in memory per worker process"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, RequestProfile]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._entries[profile.id] = profile
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            return self._entries.get(profile_id)
+
+    def list(self) -> List[RequestProfile]:
+        with self._lock:
+            return list(reversed(self._entries.values()))
+
+profile_store = ProfileStore(PROFILING_MAX_STORED)
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling requests that carry a valid X-Profile signature"""
+
+    def __init__(self, app, enabled: bool = PROFILING_ENABLED, store: ProfileStore = profile_store):
+        self.app = app
+        self.enabled = enabled
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        signature = headers.get("x-profile")
+        if not signature or not verify(signature, scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        sampler = None
+        if headers.get("x-profile-sample", "").lower() in ("1", "true"):
+            sampler = StackSampler(PROFILING_SAMPLE_INTERVAL_MS / 1000)
+            sampler.start()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Streamed bodies keep running after this; total covers up to the headers
+                profile.total = time.perf_counter() - profile.started
+                response_headers = MutableHeaders(raw=message.setdefault("headers", []))
+                response_headers.append("Server-Timing", profile.server_timing())
+                if sampler is not None:
+                    response_headers.append("X-Profile-Id", profile.id)
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if sampler is not None:
+                profile.stacks = sampler.stop()
+                profile.samples = sampler.samples
+                self.store.put(profile)
+            logger.info("profiled request", extra=profile.summary())
+
+if __name__ == "__main__":
+    if not PROFILING_SECRET or len(sys.argv) != 3:
+        sys.exit("Usage: PROFILING_SECRET=... python profiling.py METHOD PATH")
+    print(f"X-Profile: {sign(sys.argv[1], sys.argv[2])}")
@@ -0,0 +1,80 @@
+"""
+Expansion of recurring plan templates into dated occurrences.
+
+Templates are expanded only for the window being read, so a year-long
+program costs one row plus whatever occurrences were individually changed.
+"""
+from datetime import date, datetime, timedelta
+from typing import Collection, Iterator, List, NamedTuple, Optional, Tuple
+import os
+
+import models
+
+# Upper bound for reads without a `to` date against templates without an until date
+TEMPLATE_HORIZON_DAYS = int(os.getenv("TEMPLATE_HORIZON_DAYS", "366"))
+
+class Occurrence(NamedTuple):
+    template: models.PlanTemplate
+    scheduled_date: datetime
+
+def parse_weekdays(spec: str) -> List[int]:
+    return sorted({int(day) for day in spec.split(",") if day.strip()})
+
+def format_weekdays(weekdays: Collection[int]) -> str:
+    return ",".join(str(day) for day in sorted(set(weekdays)))
+
+def _week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+def horizon_anchor() -> date:
+    """UTC day open-ended reads look ahead from; their result only changes when it does"""
+    return datetime.utcnow().date()
+
+def template_occurrences(
+    template: models.PlanTemplate,
+    window_start: Optional[datetime],
+    window_end: Optional[datetime]
+) -> Iterator[datetime]:
+    """Yield the template's occurrences with window_start <= occurrence < window_end"""
+    start = template.start_date
+    end = window_end
+    if end is None:
+        # Open-ended reads look ahead from now, however long ago the template started
+        anchor = datetime.combine(horizon_anchor(), datetime.min.time())
+        end = max(start, window_start or anchor) + timedelta(days=TEMPLATE_HORIZON_DAYS)
+    if template.until_date is not None:
+        # until_date is inclusive of the whole day
+        end = min(end, datetime.combine(template.until_date.date() + timedelta(days=1), datetime.min.time()))
+    lower = max(start, window_start) if window_start is not None else start
+
+    weekdays = parse_weekdays(template.weekdays)
+    interval = max(template.interval_weeks or 1, 1)
+    first_week = _week_start(start.date())
+    week = _week_start(lower.date())
+    # Align to the first week of the cycle that is not before the window
+    offset = ((week - first_week).days // 7) % interval
+    if offset:
+        week += timedelta(weeks=interval - offset)
+
+    while datetime.combine(week, datetime.min.time()) < end:
+        for weekday in weekdays:
+            occurrence = datetime.combine(week + timedelta(days=weekday), start.time())
+            if lower <= occurrence < end:
+                yield occurrence
+        week += timedelta(weeks=interval)
+
+def expand_templates(
+    templates: List[models.PlanTemplate],
+    window_start: Optional[datetime],
+    window_end: Optional[datetime],
+    overridden: Collection[Tuple[int, datetime]] = ()
+) -> List[Occurrence]:
+    """Expand templates over a window, leaving out occurrences replaced by a stored plan"""
+    occurrences = [
+        Occurrence(template, scheduled_date)
+        for template in templates
+        for scheduled_date in template_occurrences(template, window_start, window_end)
+        if (template.id, scheduled_date) not in overridden
+    ]
+    occurrences.sort(key=lambda occurrence: (occurrence.scheduled_date, occurrence.template.id))
+    return occurrences
@@ -0,0 +1,158 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from fastapi import Request, Response
+from typing import Dict, Hashable, Optional, Set, Tuple
+import gzip
+import os
+import threading
+
+import etag
+import profiling
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Cache configuration
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Bodies larger than this are served but not cached
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024)))
+# Smaller bodies are not worth compressing
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "1024"))
+RESPONSE_GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+RESPONSE_BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "5"))
+
+def accepted_encodings(header: str) -> Set[str]:
+    """Content codings from an Accept-Encoding header, minus any refused with q=0"""
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """Final JSON body of a response plus its pre-compressed variants"""
+    body: bytes
+    gzip_body: Optional[bytes]
+    brotli_body: Optional[bytes]
+    headers: Tuple[Tuple[str, str], ...]
+    media_type: str = "application/json"
+
+    @classmethod
+    def build(cls, body: bytes, headers: Dict[str, str]) -> "CachedResponse":
+        gzip_body = brotli_body = None
+        if len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+            with profiling.phase("serialize"):
+                gzip_body = gzip.compress(body, compresslevel=RESPONSE_GZIP_LEVEL, mtime=0)
+                if brotli is not None:
+                    brotli_body = brotli.compress(body, quality=RESPONSE_BROTLI_QUALITY)
+        return cls(body, gzip_body, brotli_body, tuple(headers.items()))
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + len(self.gzip_body or b"") + len(self.brotli_body or b"")
+
+    def render(self, request: Request) -> Response:
+        """Serve the smallest variant the client accepts"""
+        headers = dict(self.headers)
+        body = self.body
+        if self.gzip_body is not None:
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+            if self.brotli_body is not None and "br" in accepted:
+                body = self.brotli_body
+                headers["Content-Encoding"] = "br"
+            elif "gzip" in accepted:
+                body = self.gzip_body
+                headers["Content-Encoding"] = "gzip"
+            # Each coding is a different representation, so it gets its own strong tag
+            if "Content-Encoding" in headers and "ETag" in headers:
+                headers["ETag"] = etag.encoded_etag(headers["ETag"], headers["Content-Encoding"])
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of rendered responses.
+
+    Keys are tuples whose second element is the owning user id, so a user's
+    entries can be dropped together when their plans change. Keys also carry
+    the user's plan version, so an entry can never outlive a write even in
+    another worker process; invalidation only frees the memory early.
+    """
+
+    def __init__(self, max_bytes: int, max_entry_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: "OrderedDict[Tuple[Hashable, ...], CachedResponse]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[Tuple[Hashable, ...]]] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[Hashable, ...]) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Tuple[Hashable, ...], entry: CachedResponse) -> None:
+        if entry.size > min(self.max_entry_bytes, self.max_bytes):
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = entry
+            self._keys_by_user.setdefault(key[1], set()).add(key)
+            self.total_bytes += entry.size
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+            self.total_bytes = 0
+
+    def _remove(self, key: Tuple[Hashable, ...]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= entry.size
+        user_keys = self._keys_by_user.get(key[1])
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self._keys_by_user[key[1]]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MAX_ENTRY_BYTES)
@@ -0,0 +1,77 @@
+"""
+Trainer roster overview: who is scheduled next, built from a fixed number
+of grouped queries however many clients are on the page.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from typing import Dict, List
+
+from recurrence import template_occurrences
+import crud
+import models
+
+ROSTER_WINDOW_DAYS = 7
+
+def _empty_stats() -> dict:
+    return {"next": None, "upcoming": 0, "last_created_at": None}
+
+def _merge_template_occurrences(
+    db: Session,
+    model,
+    templates: List[models.PlanTemplate],
+    stats: Dict[int, dict],
+    now: datetime,
+    week_end: datetime
+) -> None:
+    """Fold upcoming template occurrences into the stored-plan stats"""
+    if not templates:
+        return
+    overridden = crud.get_overridden_occurrences(db, model, [template.id for template in templates], now)
+    for template in templates:
+        user_stats = stats.setdefault(template.user_id, _empty_stats())
+        for occurrence in template_occurrences(template, now, None):
+            if (template.id, occurrence) in overridden:
+                continue
+            current = user_stats["next"]
+            if current is None or occurrence < current["scheduled_date"]:
+                user_stats["next"] = {
+                    "id": None,
+                    "title": template.title,
+                    "scheduled_date": occurrence,
+                    "template_id": template.id,
+                }
+            if occurrence >= week_end:
+                break
+            user_stats["upcoming"] += 1
+
+def build_roster(db: Session, users: List[models.User], now: datetime) -> List[dict]:
+    """Roster entries for a page of assigned users, in the page's order"""
+    user_ids = [user.id for user in users]
+    if not user_ids:
+        return []
+    week_end = now + timedelta(days=ROSTER_WINDOW_DAYS)
+
+    workout_stats = crud.get_plan_schedule_stats(db, models.WorkoutPlan, user_ids, now, week_end)
+    meal_stats = crud.get_plan_schedule_stats(db, models.MealPlan, user_ids, now, week_end)
+    templates = crud.get_plan_templates(db, user_ids, date_from=now)
+    _merge_template_occurrences(
+        db, models.WorkoutPlan, [t for t in templates if t.kind == "workout"], workout_stats, now, week_end
+    )
+    _merge_template_occurrences(
+        db, models.MealPlan, [t for t in templates if t.kind == "meal"], meal_stats, now, week_end
+    )
+
+    roster = []
+    for user in users:
+        workouts = workout_stats.get(user.id) or _empty_stats()
+        meals = meal_stats.get(user.id) or _empty_stats()
+        created = [value for value in (workouts["last_created_at"], meals["last_created_at"]) if value is not None]
+        roster.append({
+            "user": user,
+            "next_workout": workouts["next"],
+            "next_meal_plan": meals["next"],
+            "workouts_next_7_days": workouts["upcoming"],
+            "meal_plans_next_7_days": meals["upcoming"],
+            "last_plan_created_at": max(created) if created else None,
+        })
+    return roster
@@ -1,6 +1,6 @@
-from typing import Optional, List
-from pydantic import BaseModel, EmailStr, validator
-from datetime import datetime
+from typing import Literal, Optional, List
+from pydantic import BaseModel, EmailStr, conint, conlist, constr, root_validator, validator
+from datetime import date, datetime
 import json
 
 # Token schemas
@@ -35,6 +35,36 @@ class UserWithAssignments(User):
     class Config:
         orm_mode = True
 
+# Bulk assignment of users to the current admin
+MAX_BULK_ASSIGN = 1000
+
+class UserAssignment(BaseModel):
+    user_ids: conlist(int, min_items=1, max_items=MAX_BULK_ASSIGN)
+
+class AssignmentResult(BaseModel):
+    """Requested ids, split by whether this request assigned them"""
+    assigned: List[int]
+    already_assigned: List[int]
+
+# Client import from CSV or NDJSON; unknown columns (including is_admin) are ignored
+class UserImportRow(BaseModel):
+    email: EmailStr
+    full_name: constr(strip_whitespace=True, min_length=1)
+    password: constr(min_length=1)
+
+class UserImportError(BaseModel):
+    line: int
+    email: Optional[str] = None
+    error: str
+
+class UserImportReport(BaseModel):
+    """Outcome of an import; rows from batches committed before an abort stay created"""
+    rows: int
+    created: int
+    failed: int
+    errors: List[UserImportError]
+    aborted: Optional[str] = None
+
 # Exercise schema
 class Exercise(BaseModel):
     name: str
@@ -42,15 +72,21 @@ class Exercise(BaseModel):
     reps: int
     weight: float
 
+    class Config:
+        orm_mode = True
+
 # Meal schema
 class Meal(BaseModel):
     name: str
-    time: str
+    time: Optional[str] = None  # nullable for legacy meals stored without one
     calories: int
     protein: float
     carbs: float
     fats: float
-    ingredients: str
+    ingredients: Optional[str] = None
+
+    class Config:
+        orm_mode = True
 
 # Workout plan schemas
 class WorkoutPlanBase(BaseModel):
@@ -58,6 +94,9 @@ class WorkoutPlanBase(BaseModel):
     description: Optional[str] = None
     scheduled_date: datetime
     exercises: List[Exercise]
+    # Set when this plan replaces one occurrence of a recurring template
+    template_id: Optional[int] = None
+    occurrence_date: Optional[datetime] = None
 
     class Config:
         json_encoders = {
@@ -97,7 +136,7 @@ class WorkoutPlanCreate(WorkoutPlanBase):
         }
 
 class WorkoutPlan(WorkoutPlanBase):
-    id: int
+    id: Optional[int]  # None for an occurrence expanded from a template
     created_at: datetime
     user_id: int
 
@@ -120,6 +159,9 @@ class MealPlanBase(BaseModel):
     scheduled_date: datetime
     meals: List[Meal]
     user_id: int
+    # Set when this plan replaces one occurrence of a recurring template
+    template_id: Optional[int] = None
+    occurrence_date: Optional[datetime] = None
 
     class Config:
         json_encoders = {
@@ -160,7 +202,7 @@ class MealPlanCreate(MealPlanBase):
         }
 
 class MealPlan(MealPlanBase):
-    id: int
+    id: Optional[int]  # None for an occurrence expanded from a template
     created_at: datetime
 
     @validator('meals', pre=True)
@@ -173,4 +215,126 @@ class MealPlan(MealPlanBase):
         orm_mode = True
         json_encoders = {
             datetime: lambda v: v.isoformat()
-        } 
\ No newline at end of file
+        }
+
+# Bulk plan creation, e.g. a multi-week program submitted at once
+MAX_BULK_PLANS = 1000
+
+class WorkoutPlanBulkCreate(BaseModel):
+    plans: conlist(WorkoutPlanCreate, min_items=1, max_items=MAX_BULK_PLANS)
+
+class MealPlanBulkCreate(BaseModel):
+    plans: conlist(MealPlanCreate, min_items=1, max_items=MAX_BULK_PLANS)
+
+class BulkCreateResult(BaseModel):
+    """Ids of the created plans, in request order"""
+    ids: List[int]
+
+# Recurring plan templates
+class PlanTemplateBase(BaseModel):
+    kind: Literal["workout", "meal"]
+    title: str
+    description: Optional[str] = None
+    start_date: datetime
+    until_date: Optional[date] = None  # last day with occurrences, inclusive
+    weekdays: conlist(conint(ge=0, le=6), min_items=1, max_items=7)
+    interval_weeks: conint(ge=1, le=52) = 1
+    exercises: Optional[List[Exercise]] = None
+    meals: Optional[List[Meal]] = None
+    user_id: int
+
+    @validator('weekdays', pre=True)
+    def parse_weekdays(cls, v):
+        if isinstance(v, str):
+            return [int(day) for day in v.split(",") if day.strip()]
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def check_items(cls, values):
+        items_field = "exercises" if values["kind"] == "workout" else "meals"
+        if values.get(items_field) is None:
+            raise ValueError(f"{items_field} is required for a {values['kind']} template")
+        until_date = values.get("until_date")
+        if until_date is not None and until_date < values["start_date"].date():
+            raise ValueError("until_date must not be before start_date")
+        return values
+
+    class Config:
+        json_encoders = {
+            datetime: lambda v: v.isoformat()
+        }
+
+class PlanTemplateCreate(PlanTemplateBase):
+    def serialize_items(self):
+        """Serialize the template's exercises or meals the way plans store them"""
+        items = self.exercises if self.kind == "workout" else self.meals
+        return json.dumps([item.dict() for item in items])
+
+class PlanTemplate(PlanTemplateBase):
+    id: int
+    created_at: datetime
+
+# Nutrition summary
+class MacroTotals(BaseModel):
+    calories: float
+    protein: float
+    carbs: float
+    fats: float
+
+class NutritionPeriod(BaseModel):
+    period_start: date
+    plans: int
+    meals: int
+    days: int  # days in the period with at least one meal
+    totals: MacroTotals
+    daily_average: MacroTotals
+
+class UserNutritionSummary(BaseModel):
+    user_id: int
+    periods: List[NutritionPeriod]
+    totals: MacroTotals
+    period_average: MacroTotals  # over periods with at least one meal
+
+class NutritionSummary(BaseModel):
+    granularity: Literal["day", "week"]
+    date_from: datetime
+    date_to: datetime
+    users: List[UserNutritionSummary]
+
+# Training volume progression
+class VolumeTotals(BaseModel):
+    period_start: date
+    sets: int
+    reps: int
+    tonnage: float
+
+class ExerciseVolume(VolumeTotals):
+    best_weight: float
+    plans: int
+
+    class Config:
+        orm_mode = True
+
+class ExerciseProgression(BaseModel):
+    exercise: str
+    series: List[ExerciseVolume]
+
+class TrainingProgression(BaseModel):
+    user_id: int
+    exercises: List[ExerciseProgression]
+    total: List[VolumeTotals]  # all exercises combined, per week
+
+# Trainer roster overview
+class RosterPlan(BaseModel):
+    id: Optional[int]  # None for an occurrence of a recurring template
+    title: str
+    scheduled_date: datetime
+    template_id: Optional[int] = None
+
+class RosterEntry(BaseModel):
+    user: User
+    next_workout: Optional[RosterPlan]
+    next_meal_plan: Optional[RosterPlan]
+    workouts_next_7_days: int
+    meal_plans_next_7_days: int
+    last_plan_created_at: Optional[datetime]
@@ -0,0 +1,129 @@
+"""
+Fast JSON serialization for plan list responses.
+
+Plans are written through the WorkoutPlanCreate/MealPlanCreate schemas, so
+the JSON copy stored alongside each plan has already been validated once.
+List endpoints parse that stored JSON with orjson and write it straight
+through instead of rebuilding every plan as a pydantic model and then having
+FastAPI validate the whole list a second time through response_model.
+
+The JSON copy is what every plan read serves. The workout_exercises and
+plan_meals rows written beside it exist for the analytics queries only.
+"""
+from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from typing import Iterable, Optional, Sequence, Type
+import heapq
+import logging
+import orjson
+
+from recurrence import Occurrence, parse_weekdays
+import models
+import profiling
+import schemas
+
+logger = logging.getLogger(__name__)
+
+EXERCISE_FIELDS = frozenset(schemas.Exercise.__fields__)
+MEAL_FIELDS = frozenset(schemas.Meal.__fields__)
+
+def _stored_items(stored_json: Optional[str], item_schema: Type[BaseModel], fields: frozenset) -> list:
+    """
+    Parse the stored items, validating them through the item schema only if
+    they lack its exact shape (legacy plans). Raises ValueError if they fail.
+    """
+    if not stored_json:
+        return []
+    items = orjson.loads(stored_json)
+    if not isinstance(items, list):
+        raise ValueError("stored items are not a list")
+    if all(isinstance(item, dict) and item.keys() == fields for item in items):
+        return items
+    return [item_schema.parse_obj(item).dict() for item in items]
+
+def workout_plan_payload(plan: models.WorkoutPlan) -> Optional[dict]:
+    try:
+        exercises = _stored_items(plan.exercises_json, schemas.Exercise, EXERCISE_FIELDS)
+    except ValueError as e:
+        logger.error(f"Error validating workout plan {plan.id}: {str(e)}")
+        return None
+    return {
+        "title": plan.title,
+        "description": plan.description,
+        "scheduled_date": plan.scheduled_date,
+        "exercises": exercises,
+        "id": plan.id,
+        "created_at": plan.created_at,
+        "user_id": plan.user_id,
+        "template_id": plan.template_id,
+        "occurrence_date": plan.occurrence_date,
+    }
+
+def meal_plan_payload(plan: models.MealPlan) -> Optional[dict]:
+    try:
+        meals = _stored_items(plan.meals_json, schemas.Meal, MEAL_FIELDS)
+    except ValueError as e:
+        logger.error(f"Error validating meal plan {plan.id}: {str(e)}")
+        return None
+    return {
+        "title": plan.title,
+        "description": plan.description,
+        "scheduled_date": plan.scheduled_date,
+        "meals": meals,
+        "user_id": plan.user_id,
+        "id": plan.id,
+        "created_at": plan.created_at,
+        "template_id": plan.template_id,
+        "occurrence_date": plan.occurrence_date,
+    }
+
+def occurrence_payload(occurrence: Occurrence) -> dict:
+    """An unstored plan generated from a template for one date"""
+    template = occurrence.template
+    items_key = "exercises" if template.kind == "workout" else "meals"
+    return {
+        "title": template.title,
+        "description": template.description,
+        "scheduled_date": occurrence.scheduled_date,
+        items_key: orjson.loads(template.items_json),
+        "id": None,
+        "created_at": template.created_at,
+        "user_id": template.user_id,
+        "template_id": template.id,
+        "occurrence_date": occurrence.scheduled_date,
+    }
+
+def plan_template_payload(template: models.PlanTemplate) -> dict:
+    items_key = "exercises" if template.kind == "workout" else "meals"
+    return {
+        "id": template.id,
+        "kind": template.kind,
+        "title": template.title,
+        "description": template.description,
+        "start_date": template.start_date,
+        "until_date": template.until_date.date() if template.until_date else None,
+        "weekdays": parse_weekdays(template.weekdays),
+        "interval_weeks": template.interval_weeks,
+        items_key: orjson.loads(template.items_json),
+        "user_id": template.user_id,
+        "created_at": template.created_at,
+    }
+
+def _plans_response(payloads: Iterable[Optional[dict]], occurrences: Sequence[Occurrence]) -> ORJSONResponse:
+    with profiling.phase("serialize"):
+        payloads = [payload for payload in payloads if payload is not None]
+        if occurrences:
+            # Both inputs are already ordered by scheduled date, undated plans last
+            payloads = list(heapq.merge(
+                payloads,
+                (occurrence_payload(occurrence) for occurrence in occurrences),
+                key=lambda payload: payload["scheduled_date"] or datetime.max
+            ))
+        return ORJSONResponse(payloads)
+
+def workout_plans_response(plans: Iterable[models.WorkoutPlan], occurrences: Sequence[Occurrence] = ()) -> ORJSONResponse:
+    return _plans_response((workout_plan_payload(plan) for plan in plans), occurrences)
+
+def meal_plans_response(plans: Iterable[models.MealPlan], occurrences: Sequence[Occurrence] = ()) -> ORJSONResponse:
+    return _plans_response((meal_plan_payload(plan) for plan in plans), occurrences)
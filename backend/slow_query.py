@@ -0,0 +1,222 @@
+"""
+Slow-query log fed by engine cursor events.
+
+Statements that run longer than SLOW_QUERY_MS are normalized (literals and
+bind placeholders replaced with ?, IN and VALUES lists collapsed) and
+grouped by a fingerprint of that text. The first slow execution of each
+fingerprint is explained on the same connection (EXPLAIN QUERY PLAN on
+SQLite, EXPLAIN (FORMAT JSON) on PostgreSQL) and logged with its plan;
+later ones only update the counters shown at /internal/slow-queries.
+Parameter values are never logged, only their types.
+"""
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import List, Optional
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this many milliseconds are logged; 0 turns the log off
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "1").lower() not in ("0", "false", "no")
+# Distinct fingerprints kept per worker process, least recently seen dropped first
+SLOW_QUERY_MAX_FINGERPRINTS = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", "500"))
+
+# Only these can be explained without side effects (EXPLAIN does not execute them)
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_VALUE_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_REPEATED_LISTS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+metrics.registry.describe("db_slow_queries_total", "counter", "Statements slower than SLOW_QUERY_MS, by engine")
+
+def normalize(statement: str) -> str:
+    """Statement text with literal values and list lengths removed"""
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _VALUE_LIST.sub("(...)", statement)
+    statement = _REPEATED_LISTS.sub("(...)", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+def fingerprint(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+def redact(parameters) -> object:
+    """Parameter types in place of their values"""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+def _has_full_scan(dialect_name: str, plan) -> bool:
+    """Whether the plan reads a whole table rather than going through an index"""
+    if dialect_name == "sqlite":
+        return any(
+            line.startswith("SCAN ") and "USING INDEX" not in line and "USING COVERING INDEX" not in line
+            for line in plan
+        )
+    return '"Seq Scan"' in json.dumps(plan)
+
+def explain(conn, statement: str, parameters) -> Optional[object]:
+    """The plan of a statement, run on a raw cursor so no engine events fire"""
+    dialect_name = conn.dialect.name
+    if dialect_name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect_name == "postgresql":
+        prefix = "EXPLAIN (FORMAT JSON) "
+    else:
+        return None
+
+    cursor = conn.connection.cursor()
+    # A failed statement aborts a PostgreSQL transaction, so fence the EXPLAIN off
+    savepoint = dialect_name == "postgresql" and conn.in_transaction()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            raise
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        cursor.close()
+
+    if dialect_name == "sqlite":
+        # (id, parent, notused, detail); parent ids give the nesting depth
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append("  " * (depth[node_id] - 1) + detail)
+        return lines
+    plan = rows[0][0]
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+class SlowQueryEntry:
+    """Counters and the captured plan for one statement fingerprint"""
+
+    def __init__(self, fingerprint: str, statement: str, engine_name: str):
+        self.fingerprint = fingerprint
+        self.statement = statement
+        self.engine = engine_name
+        self.first_seen = datetime.utcnow()
+        self.last_seen = self.first_seen
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.plan = None
+        self.full_scan: Optional[bool] = None
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seen = datetime.utcnow()
+
+    def summary(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "statement": self.statement,
+            "engine": self.engine,
+            "count": self.count,
+            "total_ms": round(self.total_seconds * 1000, 3),
+            "avg_ms": round(self.total_seconds / self.count * 1000, 3) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "full_scan": self.full_scan,
+            "plan": self.plan,
+        }
+
+class SlowQueryLog:
+    """Slow statements grouped by fingerprint, kept in memory per worker process"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, max_entries: int = SLOW_QUERY_MAX_FINGERPRINTS,
+                 capture_plans: bool = SLOW_QUERY_EXPLAIN):
+        self.threshold = threshold_ms / 1000
+        self.max_entries = max_entries
+        self.capture_plans = capture_plans
+        self._entries: "OrderedDict[str, SlowQueryEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("slow_query_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if elapsed >= self.threshold:
+            self.record(conn, statement, parameters, executemany, elapsed)
+
+    def record(self, conn, statement: str, parameters, executemany: bool, elapsed: float) -> None:
+        normalized = normalize(statement)
+        key = fingerprint(normalized)
+        engine_name = "async" if conn.dialect.is_async else "sync"
+        metrics.inc("db_slow_queries_total", (("engine", engine_name),))
+        with self._lock:
+            entry = self._entries.get(key)
+            first = entry is None
+            if first:
+                entry = self._entries[key] = SlowQueryEntry(key, normalized, engine_name)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(key)
+            entry.record(elapsed)
+        if not first:
+            return
+
+        if self.capture_plans and not executemany and normalized.upper().startswith(_EXPLAINABLE):
+            try:
+                entry.plan = explain(conn, statement, parameters)
+                if entry.plan is not None:
+                    entry.full_scan = _has_full_scan(conn.dialect.name, entry.plan)
+            except Exception as e:
+                logger.warning(f"Could not explain slow query {key}: {str(e)}")
+        logger.warning("slow query", extra={
+            "fingerprint": key,
+            "statement": normalized,
+            "duration_ms": round(elapsed * 1000, 3),
+            "parameters": redact(parameters),
+            "full_scan": entry.full_scan,
+            "plan": entry.plan,
+        })
+
+    def entries(self) -> List[dict]:
+        """Summaries of every fingerprint, most total time first"""
+        with self._lock:
+            entries = list(self._entries.values())
+        return sorted((entry.summary() for entry in entries), key=lambda entry: entry["total_ms"], reverse=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+slow_query_log = SlowQueryLog()
+
+def instrument_engine(engine: Engine, log: SlowQueryLog = slow_query_log) -> None:
+    """Time the engine's statements into the slow-query log (pass async_engine.sync_engine for asyncio)"""
+    event.listen(engine, "before_cursor_execute", log._before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", log._after_cursor_execute)
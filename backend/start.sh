@@ -1,3 +1,3 @@
 #!/bin/bash
 echo "Starting FastAPI application..."
-uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000} --log-level debug 
\ No newline at end of file
+uvicorn main:app --host 0.0.0.0 --port ${PORT:-8000} --log-level ${UVICORN_LOG_LEVEL:-warning} --no-access-log 
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""
+Shared fixtures. Every test gets a fresh, throwaway SQLite database; the app
+modules read DATABASE_URL at import time, so it is set before they load.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+
+import database
+import models
+
+@pytest.fixture
+def db():
+    models.Base.metadata.create_all(bind=database.engine)
+    session = database.SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        models.Base.metadata.drop_all(bind=database.engine)
+
+@pytest.fixture
+def make_user(db):
+    """Insert a user directly, skipping the bcrypt hash"""
+    def make(email: str, is_admin: bool = False) -> models.User:
+        user = models.User(email=email, full_name=email, hashed_password="x", is_admin=is_admin)
+        db.add(user)
+        db.commit()
+        return user
+    return make
@@ -0,0 +1,63 @@
+import asyncio
+
+import crud
+import database
+import models
+
+def assigned_ids(db, admin_id):
+    return [user.id for user in crud.get_admin_users(db, admin_id).items]
+
+def test_returns_only_newly_assigned_ids(db, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    users = [make_user(f"u{i}@example.com") for i in range(3)]
+    first, second, third = (user.id for user in users)
+
+    assert crud.assign_users_to_admin(db, admin.id, [first, second]) == {first, second}
+    assert crud.assign_users_to_admin(db, admin.id, [second, third]) == {third}
+    assert crud.assign_users_to_admin(db, admin.id, [first, second, third]) == set()
+    assert assigned_ids(db, admin.id) == [first, second, third]
+
+def test_duplicate_ids_in_one_call_are_assigned_once(db, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    user = make_user("u@example.com")
+    assert crud.assign_users_to_admin(db, admin.id, [user.id, user.id]) == {user.id}
+    assert db.query(models.admin_user_association).count() == 1
+
+def test_non_admin_returns_none(db, make_user):
+    not_admin = make_user("coach@example.com")
+    user = make_user("u@example.com")
+    assert crud.assign_users_to_admin(db, not_admin.id, [user.id]) is None
+    assert crud.assign_users_to_admin(db, 999, [user.id]) is None
+    assert db.query(models.admin_user_association).count() == 0
+
+def test_assignments_are_per_admin(db, make_user):
+    first_admin = make_user("a@example.com", is_admin=True)
+    second_admin = make_user("b@example.com", is_admin=True)
+    user = make_user("u@example.com")
+    assert crud.assign_users_to_admin(db, first_admin.id, [user.id]) == {user.id}
+    assert crud.assign_users_to_admin(db, second_admin.id, [user.id]) == {user.id}
+    assert assigned_ids(db, first_admin.id) == assigned_ids(db, second_admin.id) == [user.id]
+
+def test_single_assignment_wrapper(db, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    user = make_user("u@example.com")
+    assert crud.assign_user_to_admin(db, admin.id, user.id).id == user.id
+    # Already assigned still reports the user
+    assert crud.assign_user_to_admin(db, admin.id, user.id).id == user.id
+    assert crud.assign_user_to_admin(db, admin.id, 999) is None
+
+def assign_async(admin_id, user_id):
+    async def assign():
+        async with database.AsyncSessionLocal() as session:
+            user = await crud.assign_user_to_admin_async(session, admin_id, user_id)
+        await database.async_engine.dispose()
+        return user
+    return asyncio.run(assign())
+
+def test_async_assignment_skips_an_existing_pair(db, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    user = make_user("u@example.com")
+    assert assign_async(admin.id, user.id).id == user.id
+    assert assign_async(admin.id, user.id).id == user.id
+    assert db.query(models.admin_user_association).count() == 1
+    assert assign_async(admin.id, 999) is None
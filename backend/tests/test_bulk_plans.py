@@ -0,0 +1,35 @@
+"""Bulk plan creation returns the ids of the rows it stored, in request order"""
+from datetime import datetime, timedelta
+
+import crud
+import models
+import schemas
+
+WHEN = datetime(2025, 4, 20, 18, 0)
+
+def workout_plans(user_id, count):
+    return [
+        schemas.WorkoutPlanCreate(title=f"W{i}", scheduled_date=WHEN + timedelta(days=i),
+                                  exercises=[{"name": "Squat", "sets": 3, "reps": 5, "weight": 100}],
+                                  assigned_user_id=user_id)
+        for i in range(count)
+    ]
+
+def test_ids_match_the_stored_rows(db, make_user):
+    user = make_user("u@example.com")
+    # Existing rows, the newest deleted, so the new ids do not start at 1
+    earlier = crud.create_workout_plans_bulk(db, workout_plans(user.id, 3))
+    db.query(models.WorkoutPlan).filter(models.WorkoutPlan.id == earlier[-1]).delete()
+    db.commit()
+
+    ids = crud.create_workout_plans_bulk(db, workout_plans(user.id, 4))
+    assert len(set(ids)) == 4 and min(ids) > earlier[1]
+    titles = dict(db.query(models.WorkoutPlan.id, models.WorkoutPlan.title).filter(models.WorkoutPlan.id.in_(ids)))
+    assert [titles[plan_id] for plan_id in ids] == ["W0", "W1", "W2", "W3"]
+    exercise_plan_ids = {plan_id for (plan_id,) in db.query(models.WorkoutExercise.plan_id)}
+    assert set(ids) <= exercise_plan_ids
+
+def test_a_single_plan(db, make_user):
+    user = make_user("u@example.com")
+    [plan_id] = crud.create_workout_plans_bulk(db, workout_plans(user.id, 1))
+    assert db.get(models.WorkoutPlan, plan_id).title == "W0"
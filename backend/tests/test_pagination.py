@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+import pytest
+
+from pagination import decode_cursor, encode_cursor
+import crud
+import models
+
+def add_plans(db, user_id, dates):
+    plans = [models.WorkoutPlan(title=f"plan {i}", user_id=user_id, scheduled_date=day) for i, day in enumerate(dates)]
+    db.add_all(plans)
+    db.commit()
+    return plans
+
+def all_pages(fetch, limit):
+    """Follow next_cursor until the last page, returning every row"""
+    rows = []
+    cursor = None
+    while True:
+        page = fetch(limit=limit, cursor=cursor)
+        assert len(page.items) <= limit
+        rows.extend(page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return rows
+
+def test_cursor_round_trip():
+    columns = [models.WorkoutPlan.scheduled_date, models.WorkoutPlan.id]
+    values = [datetime(2025, 4, 20, 18, 7, 48), 42]
+    assert decode_cursor(encode_cursor(values), columns) == values
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor([1]), encode_cursor(["not a date", 1])])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as excinfo:
+        decode_cursor(cursor, [models.WorkoutPlan.scheduled_date, models.WorkoutPlan.id])
+    assert excinfo.value.status_code == 400
+
+def test_pages_cover_every_plan_once_in_order(db, make_user):
+    user = make_user("u@example.com")
+    start = datetime(2025, 1, 1, 9)
+    # Repeated dates make the id tiebreaker matter
+    add_plans(db, user.id, [start + timedelta(days=i // 3) for i in range(10)])
+
+    def fetch(**kwargs):
+        return crud.get_user_workout_plans(db, user.id, **kwargs)
+
+    rows = all_pages(fetch, limit=4)
+    keys = [(plan.scheduled_date, plan.id) for plan in rows]
+    assert len(keys) == 10
+    assert keys == sorted(keys)
+
+def test_pages_place_undated_plans_last_without_gaps(db, make_user):
+    user = make_user("u@example.com")
+    add_plans(db, user.id, [datetime(2025, 1, 3), None, datetime(2025, 1, 1), None, datetime(2025, 1, 1), None])
+
+    def fetch(**kwargs):
+        return crud.get_user_workout_plans(db, user.id, **kwargs)
+
+    for limit in (1, 2, 4):
+        rows = all_pages(fetch, limit=limit)
+        assert [plan.id for plan in rows] == [3, 5, 1, 2, 4, 6]
+
+def test_last_page_has_no_cursor(db, make_user):
+    user = make_user("u@example.com")
+    add_plans(db, user.id, [datetime(2025, 1, 1), datetime(2025, 1, 2)])
+    page = crud.get_user_workout_plans(db, user.id, limit=2)
+    assert len(page.items) == 2
+    assert page.next_cursor is None
+
+def test_skip_is_ignored_once_a_cursor_is_given(db, make_user):
+    user = make_user("u@example.com")
+    add_plans(db, user.id, [datetime(2025, 1, day) for day in range(1, 6)])
+    first = crud.get_user_workout_plans(db, user.id, limit=2)
+    by_skip = crud.get_user_workout_plans(db, user.id, skip=2, limit=2)
+    by_cursor = crud.get_user_workout_plans(db, user.id, skip=4, limit=2, cursor=first.next_cursor)
+    assert [plan.id for plan in by_skip.items] == [plan.id for plan in by_cursor.items] == [3, 4]
+
+def test_row_keys_read_the_cursor_from_the_row(db, make_user):
+    # Assigned users are ordered by admin_users.user_id but the rows are
+    # User objects, so the cursor value comes from row_keys=["id"]
+    admin = make_user("admin@example.com", is_admin=True)
+    other_admin = make_user("other@example.com", is_admin=True)
+    users = [make_user(f"u{i}@example.com") for i in range(5)]
+    crud.assign_users_to_admin(db, admin.id, [user.id for user in users[::-1]])
+    crud.assign_users_to_admin(db, other_admin.id, [users[0].id])
+
+    def fetch(**kwargs):
+        return crud.get_admin_users(db, admin.id, **kwargs)
+
+    rows = all_pages(fetch, limit=2)
+    assert [user.id for user in rows] == [user.id for user in users]
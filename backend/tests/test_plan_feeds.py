@@ -0,0 +1,71 @@
+"""Revalidation and caching of the per-user plan feeds"""
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from auth import get_current_user
+from identity_cache import UserSnapshot
+from response_cache import response_cache
+import main
+import models
+import recurrence
+
+@pytest.fixture
+def user(make_user):
+    return make_user("u@example.com")
+
+@pytest.fixture
+def client(user):
+    main.app.dependency_overrides[get_current_user] = lambda: UserSnapshot.from_user(user)
+    response_cache.clear()
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
+        response_cache.clear()
+
+@pytest.mark.parametrize("feed", ["/workout-plans/user", "/meal-plans/user"])
+def test_open_ended_etag_moves_with_the_horizon_day(client, monkeypatch, feed):
+    monkeypatch.setattr(recurrence, "horizon_anchor", lambda: date(2025, 1, 1))
+    first = client.get(feed)
+    assert client.get(feed, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    monkeypatch.setattr(recurrence, "horizon_anchor", lambda: date(2025, 1, 2))
+    later = client.get(feed, headers={"If-None-Match": first.headers["ETag"]})
+    assert later.status_code == 200
+    # The cached body of the earlier day is not served under the new tag
+    assert later.headers["ETag"] != first.headers["ETag"]
+
+def test_bounded_etag_ignores_the_horizon_day(client, monkeypatch):
+    feed = "/workout-plans/user?to=2025-02-01"
+    monkeypatch.setattr(recurrence, "horizon_anchor", lambda: date(2025, 1, 1))
+    first = client.get(feed)
+    monkeypatch.setattr(recurrence, "horizon_anchor", lambda: date(2025, 1, 2))
+    assert client.get(feed, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+def test_each_coding_has_its_own_etag(client, monkeypatch):
+    monkeypatch.setattr("response_cache.RESPONSE_COMPRESS_MIN_BYTES", 0)
+    feed = "/workout-plans/user"
+    identity = client.get(feed, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get(feed, headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+
+    revalidated = client.get(feed, headers={"Accept-Encoding": "gzip", "If-None-Match": gzipped.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["Vary"] == "Accept-Encoding"
+
+def test_next_page_is_linked_from_the_response(client, db, user):
+    db.add_all([models.WorkoutPlan(title=f"plan {day}", user_id=user.id, scheduled_date=datetime(2025, 1, day))
+                for day in (1, 2, 3)])
+    db.commit()
+    first = client.get("/workout-plans/user?to=2025-02-01&limit=2")
+    assert [plan["title"] for plan in first.json()] == ["plan 1", "plan 2"]
+    link, rel = first.headers["Link"].split("; ")
+    assert rel == 'rel="next"'
+    assert first.headers["X-Next-Cursor"] in link
+
+    second = client.get(link.strip("<>"))
+    assert [plan["title"] for plan in second.json()] == ["plan 3"]
+    assert "Link" not in second.headers and "X-Next-Cursor" not in second.headers
@@ -0,0 +1,95 @@
+"""The exercise and meal rows stay in step with the JSON copy that plan reads serve"""
+from datetime import datetime
+import asyncio
+import json
+
+import pytest
+
+import crud
+import database
+import migrations
+import models
+import schemas
+import serialization
+
+EXERCISES = [{"name": "Squat", "sets": 3, "reps": 5, "weight": 100}, {"name": "Row", "sets": 3, "reps": 8, "weight": 60}]
+MEALS = [{"name": "Breakfast", "time": "08:00", "calories": 500, "protein": 25, "carbs": 60, "fats": 20,
+          "ingredients": "oats"}, {"name": "Dinner", "time": None, "calories": 700, "protein": 40, "carbs": 70,
+          "fats": 25, "ingredients": None}]
+WHEN = datetime(2025, 4, 20, 18, 0)
+
+def assert_rows_match_json(db):
+    for plan in db.query(models.WorkoutPlan):
+        stored = [schemas.Exercise.parse_obj(item).dict() for item in json.loads(plan.exercises_json)]
+        assert [schemas.Exercise.from_orm(row).dict() for row in plan.exercises] == stored
+    for plan in db.query(models.MealPlan):
+        stored = [schemas.Meal.parse_obj(item).dict() for item in json.loads(plan.meals_json)]
+        assert [schemas.Meal.from_orm(row).dict() for row in plan.meals] == stored
+
+def workout_plan(user_id):
+    return schemas.WorkoutPlanCreate(title="W", scheduled_date=WHEN, exercises=EXERCISES, assigned_user_id=user_id)
+
+def meal_plan(user_id):
+    return schemas.MealPlanCreate(title="M", scheduled_date=WHEN, meals=MEALS, user_id=user_id)
+
+def create_meal_plan_async(db, user_id):
+    async def create():
+        async with database.AsyncSessionLocal() as session:
+            await crud.create_meal_plan_async(session, meal_plan(user_id))
+        await database.async_engine.dispose()
+    asyncio.run(create())
+
+WRITES = {
+    "create_workout_plan": lambda db, user_id: crud.create_workout_plan(db, workout_plan(user_id)),
+    "create_meal_plan": lambda db, user_id: crud.create_meal_plan(db, meal_plan(user_id)),
+    "create_meal_plan_async": create_meal_plan_async,
+    "create_workout_plans_bulk": lambda db, user_id: crud.create_workout_plans_bulk(db, [workout_plan(user_id)] * 2),
+    "create_meal_plans_bulk": lambda db, user_id: crud.create_meal_plans_bulk(db, [meal_plan(user_id)] * 2),
+}
+
+@pytest.mark.parametrize("write", WRITES.values(), ids=list(WRITES))
+def test_created_rows_match_the_json(db, make_user, write):
+    user = make_user("u@example.com")
+    write(db, user.id)
+    db.expire_all()
+    assert db.query(models.WorkoutExercise).count() + db.query(models.PlanMeal).count() > 0
+    assert_rows_match_json(db)
+
+def test_backfilled_rows_match_the_json(db, make_user):
+    user = make_user("u@example.com")
+    # Legacy plans: JSON only, and meals written before time and ingredients were required
+    legacy_meals = [{key: value for key, value in meal.items() if value is not None} for meal in MEALS]
+    db.execute(models.WorkoutPlan.__table__.insert(), [
+        {"title": "W", "user_id": user.id, "scheduled_date": WHEN, "exercises": json.dumps(EXERCISES)}
+    ])
+    db.execute(models.MealPlan.__table__.insert(), [
+        {"title": "M", "user_id": user.id, "scheduled_date": WHEN, "meals": json.dumps(legacy_meals)}
+    ])
+    db.commit()
+
+    migrations.backfill_plan_children(database.engine)
+    db.expire_all()
+    assert db.query(models.WorkoutExercise).count() == len(EXERCISES)
+    assert db.query(models.PlanMeal).count() == len(MEALS)
+    assert_rows_match_json(db)
+
+def test_reads_serve_the_json_without_loading_rows(db, make_user):
+    user = make_user("u@example.com")
+    crud.create_meal_plan(db, meal_plan(user.id))
+    plan = db.query(models.MealPlan).one()
+    # Legacy shape: the missing fields are filled in from the schema
+    plan.meals_json = json.dumps([{"name": "Snack", "calories": 100, "protein": 1, "carbs": 20, "fats": 1}])
+    db.commit()
+    db.expire_all()
+
+    plan = db.query(models.MealPlan).one()
+    payload = serialization.meal_plan_payload(plan)
+    assert "meals" not in plan.__dict__
+    assert payload["meals"] == [{"name": "Snack", "time": None, "calories": 100, "protein": 1.0, "carbs": 20.0,
+                                 "fats": 1.0, "ingredients": None}]
+
+def test_unreadable_json_leaves_the_plan_out(db, make_user):
+    user = make_user("u@example.com")
+    db.add(models.WorkoutPlan(title="W", user_id=user.id, scheduled_date=WHEN, exercises_json='{"not": "a list"}'))
+    db.commit()
+    assert serialization.workout_plan_payload(db.query(models.WorkoutPlan).one()) is None
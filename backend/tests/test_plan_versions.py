@@ -0,0 +1,73 @@
+"""Every plan write moves the owner's feed version and drops their cached feed responses"""
+from datetime import datetime
+import asyncio
+
+import pytest
+
+from response_cache import CachedResponse, response_cache
+import crud
+import database
+import schemas
+
+EXERCISES = [{"name": "Squat", "sets": 3, "reps": 5, "weight": 100}]
+MEALS = [{"name": "Breakfast", "time": "08:00", "calories": 500, "protein": 25, "carbs": 60, "fats": 20,
+          "ingredients": "oats"}]
+WHEN = datetime(2025, 4, 20, 18, 0)
+
+def workout_plan(user_id):
+    return schemas.WorkoutPlanCreate(title="W", scheduled_date=WHEN, exercises=EXERCISES, assigned_user_id=user_id)
+
+def meal_plan(user_id):
+    return schemas.MealPlanCreate(title="M", scheduled_date=WHEN, meals=MEALS, user_id=user_id)
+
+def create_meal_plan_async(db, user_id):
+    async def create():
+        async with database.AsyncSessionLocal() as session:
+            await crud.create_meal_plan_async(session, meal_plan(user_id))
+        await database.async_engine.dispose()
+    asyncio.run(create())
+
+WRITES = {
+    "create_workout_plan": lambda db, user_id: crud.create_workout_plan(db, workout_plan(user_id)),
+    "create_meal_plan": lambda db, user_id: crud.create_meal_plan(db, meal_plan(user_id)),
+    "create_meal_plan_async": create_meal_plan_async,
+    "create_workout_plans_bulk": lambda db, user_id: crud.create_workout_plans_bulk(db, [workout_plan(user_id)] * 2),
+    "create_meal_plans_bulk": lambda db, user_id: crud.create_meal_plans_bulk(db, [meal_plan(user_id)] * 2),
+    "create_plan_template": lambda db, user_id: crud.create_plan_template(db, schemas.PlanTemplateCreate(
+        kind="workout", title="T", start_date=WHEN, weekdays=[0], exercises=EXERCISES, user_id=user_id
+    )),
+}
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+def cache_feed(user_id, version):
+    key = ("workout-plans", user_id, version, "")
+    response_cache.put(key, CachedResponse.build(b"[]", {}))
+    return key
+
+@pytest.mark.parametrize("write", WRITES.values(), ids=list(WRITES))
+def test_write_bumps_version_and_drops_cached_feeds(db, make_user, write):
+    user = make_user("u@example.com")
+    bystander = make_user("v@example.com")
+    version = crud.get_plan_version(db, user.id)
+    user_key = cache_feed(user.id, version)
+    bystander_key = cache_feed(bystander.id, crud.get_plan_version(db, bystander.id))
+
+    write(db, user.id)
+    db.expire_all()
+
+    assert crud.get_plan_version(db, user.id) == version + 1
+    assert response_cache.get(user_key) is None
+    assert crud.get_plan_version(db, bystander.id) == 0
+    assert response_cache.get(bystander_key) is not None
+
+def test_bulk_write_bumps_each_user_once(db, make_user):
+    first = make_user("u@example.com")
+    second = make_user("v@example.com")
+    crud.create_workout_plans_bulk(db, [workout_plan(first.id), workout_plan(first.id), workout_plan(second.id)])
+    assert crud.get_plan_version(db, first.id) == 1
+    assert crud.get_plan_version(db, second.id) == 1
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+import pytest
+
+from main import check_override_templates
+from recurrence import TEMPLATE_HORIZON_DAYS, expand_templates, template_occurrences
+from pagination import encode_cursor
+import crud
+import models
+
+MONDAY = datetime(2025, 1, 6, 7, 30)
+
+def template(**overrides) -> models.PlanTemplate:
+    fields = dict(id=1, user_id=1, kind="workout", title="Program", items_json="[]",
+                  start_date=MONDAY, until_date=None, weekdays="0,2,4", interval_weeks=1)
+    fields.update(overrides)
+    return models.PlanTemplate(**fields)
+
+def test_occurrences_fall_on_weekdays_at_the_start_time():
+    occurrences = list(template_occurrences(template(), MONDAY, MONDAY + timedelta(weeks=2)))
+    assert occurrences == [MONDAY + timedelta(days=day) for day in (0, 2, 4, 7, 9, 11)]
+
+def test_window_bounds_are_inclusive_then_exclusive():
+    window_start = MONDAY + timedelta(days=2)
+    window_end = MONDAY + timedelta(days=9)
+    occurrences = list(template_occurrences(template(), window_start, window_end))
+    assert occurrences == [MONDAY + timedelta(days=day) for day in (2, 4, 7)]
+
+def test_nothing_before_the_start_date():
+    occurrences = list(template_occurrences(template(start_date=MONDAY + timedelta(days=2)), MONDAY, MONDAY + timedelta(weeks=1)))
+    assert occurrences == [MONDAY + timedelta(days=day) for day in (2, 4)]
+
+def test_interval_weeks_stay_aligned_to_the_start_week():
+    biweekly = template(weekdays="1", interval_weeks=2)
+    # A window opening in an off week skips ahead to the next week of the cycle
+    window_start = MONDAY + timedelta(weeks=3)
+    occurrences = list(template_occurrences(biweekly, window_start, window_start + timedelta(weeks=4)))
+    assert occurrences == [MONDAY + timedelta(weeks=week, days=1) for week in (4, 6)]
+
+def test_until_date_includes_its_whole_day():
+    ending = template(until_date=MONDAY.replace(hour=0, minute=0) + timedelta(days=9))
+    occurrences = list(template_occurrences(ending, None, None))
+    assert occurrences[-1] == MONDAY + timedelta(days=9)
+    assert len(occurrences) == 5
+
+def test_open_ended_reads_look_ahead_from_now():
+    old = template(start_date=datetime.utcnow().replace(microsecond=0) - timedelta(days=3 * 365), weekdays="0")
+    today = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    occurrences = list(template_occurrences(old, today, None))
+    assert occurrences
+    assert occurrences[0] >= today
+    assert occurrences[-1] > today + timedelta(days=TEMPLATE_HORIZON_DAYS - 7)
+    # Without a window start the horizon is still counted from the start of today
+    assert list(template_occurrences(old, None, None))[-1] == occurrences[-1]
+
+def test_expand_templates_skips_overridden_occurrences():
+    occurrences = expand_templates([template()], MONDAY, MONDAY + timedelta(weeks=1), {(1, MONDAY + timedelta(days=2))})
+    assert [occurrence.scheduled_date for occurrence in occurrences] == [MONDAY, MONDAY + timedelta(days=4)]
+
+def add_template(db, user_id):
+    db_template = template(id=None, user_id=user_id)
+    db.add(db_template)
+    db.commit()
+    return db_template
+
+def add_override(db, user_id, template_id, occurrence_date):
+    db.add(models.WorkoutPlan(title="Changed", user_id=user_id, scheduled_date=occurrence_date,
+                              template_id=template_id, occurrence_date=occurrence_date))
+    db.commit()
+
+def week_of_occurrences(db, user_id):
+    occurrences = crud.get_plan_occurrences(db, models.WorkoutPlan, "workout", [user_id], MONDAY, MONDAY + timedelta(weeks=1))
+    return [occurrence.scheduled_date for occurrence in occurrences]
+
+def test_an_override_plan_replaces_its_occurrence(db, make_user):
+    user = make_user("u@example.com")
+    db_template = add_template(db, user.id)
+    add_override(db, user.id, db_template.id, MONDAY + timedelta(days=2))
+    assert week_of_occurrences(db, user.id) == [MONDAY, MONDAY + timedelta(days=4)]
+
+def test_another_users_plan_cannot_hide_an_occurrence(db, make_user):
+    owner = make_user("u@example.com")
+    other = make_user("v@example.com")
+    db_template = add_template(db, owner.id)
+    add_override(db, other.id, db_template.id, MONDAY + timedelta(days=2))
+    assert week_of_occurrences(db, owner.id) == [MONDAY + timedelta(days=day) for day in (0, 2, 4)]
+
+def test_override_templates_are_checked_against_user_and_kind():
+    templates = {1: template()}
+    check_override_templates(templates, [(1, 1)], "workout")
+    for overrides, kind, status_code in (
+        ([(2, 1)], "workout", 404),
+        ([(1, 2)], "workout", 422),
+        ([(1, 1)], "meal", 422),
+    ):
+        with pytest.raises(HTTPException) as excinfo:
+            check_override_templates(templates, overrides, kind)
+        assert excinfo.value.status_code == status_code
+
+def feed_items(page):
+    """(scheduled_date, plan id, template id) of each item, in the order the feed serves them"""
+    items = [(plan.scheduled_date, plan.id, None) for plan in page.plans]
+    items += [(occurrence.scheduled_date, None, occurrence.template.id) for occurrence in page.occurrences]
+    return sorted(items, key=lambda item: (item[0] is None, item[0] or datetime.min, item[1] is None, item[1] or item[2]))
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 5])
+def test_feed_pages_merge_plans_and_occurrences_without_gaps(db, make_user, limit):
+    user = make_user("u@example.com")
+    db_template = template(id=None, user_id=user.id, until_date=MONDAY + timedelta(days=6))
+    db.add(db_template)
+    db.commit()
+    add_override(db, user.id, db_template.id, MONDAY + timedelta(days=2))
+    db.add_all([models.WorkoutPlan(title="Plan", user_id=user.id, scheduled_date=day)
+                for day in (MONDAY, MONDAY + timedelta(days=1), None)])
+    db.commit()
+
+    def fetch(limit, cursor=None):
+        return crud.get_user_plan_feed(db, models.WorkoutPlan, "workout", user.id, limit=limit, cursor=cursor)
+
+    everything = feed_items(fetch(None))
+    # Occurrences on Monday and Friday; the stored Monday plan sorts first and the undated one last
+    assert [item[2] for item in everything] == [None, db_template.id, None, None, db_template.id, None]
+    assert everything[-1][0] is None
+    paged, cursor = [], None
+    for _ in range(len(everything)):
+        page = fetch(limit, cursor)
+        assert len(page.plans) + len(page.occurrences) <= limit
+        paged.extend(feed_items(page))
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert paged == everything
+
+def test_feed_rejects_a_cursor_it_did_not_issue(db, make_user):
+    user = make_user("u@example.com")
+    with pytest.raises(HTTPException) as excinfo:
+        crud.get_user_plan_feed(db, models.WorkoutPlan, "workout", user.id, cursor=encode_cursor([None, None, 1]))
+    assert excinfo.value.status_code == 400
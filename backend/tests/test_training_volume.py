@@ -0,0 +1,63 @@
+from datetime import date, datetime
+
+from training_volume import VolumeDelta, apply_volume_deltas, volume_deltas
+import crud
+import models
+import schemas
+
+MONDAY = date(2025, 1, 6)
+
+def exercise(name, sets, reps, weight):
+    return schemas.Exercise(name=name, sets=sets, reps=reps, weight=weight)
+
+def rows(db, user_id):
+    db.expire_all()
+    return {(row.exercise, row.period_start): row for row in crud.get_training_volume(db, user_id)}
+
+def test_deltas_bucket_by_user_exercise_and_week():
+    deltas = volume_deltas([
+        (1, datetime(2025, 1, 6, 9), [exercise("Squat", 3, 5, 100), exercise(" squat ", 2, 5, 120)]),
+        (1, datetime(2025, 1, 12, 9), [exercise("Squat", 1, 1, 140)]),  # Sunday, same week
+        (1, datetime(2025, 1, 13, 9), [exercise("Squat", 1, 1, 90)]),
+        (1, None, [exercise("Squat", 9, 9, 999)]),  # undated plans are not rolled up
+    ])
+    assert deltas == {
+        (1, "squat", MONDAY): VolumeDelta(sets=6, reps=26, tonnage=2840.0, best_weight=140.0, plans=2),
+        (1, "squat", date(2025, 1, 13)): VolumeDelta(sets=1, reps=1, tonnage=90.0, best_weight=90.0, plans=1),
+    }
+
+def test_upsert_inserts_then_accumulates(db, make_user):
+    user = make_user("u@example.com")
+    first = volume_deltas([(user.id, datetime(2025, 1, 7), [exercise("Bench", 3, 10, 60)])])
+    apply_volume_deltas(db, first)
+    db.commit()
+    row = rows(db, user.id)[("bench", MONDAY)]
+    assert (row.sets, row.reps, row.tonnage, row.best_weight, row.plans) == (3, 30, 1800.0, 60.0, 1)
+
+    second = volume_deltas([(user.id, datetime(2025, 1, 9), [exercise("BENCH", 2, 5, 80)])])
+    apply_volume_deltas(db, second)
+    db.commit()
+    assert len(rows(db, user.id)) == 1
+    row = rows(db, user.id)[("bench", MONDAY)]
+    assert (row.sets, row.reps, row.tonnage, row.best_weight, row.plans) == (5, 40, 2600.0, 80.0, 2)
+
+def test_upsert_keeps_the_higher_best_weight(db, make_user):
+    user = make_user("u@example.com")
+    for weight in (100, 80):
+        apply_volume_deltas(db, volume_deltas([(user.id, datetime(2025, 1, 6), [exercise("Squat", 1, 1, weight)])]))
+        db.commit()
+    assert rows(db, user.id)[("squat", MONDAY)].best_weight == 100.0
+
+def test_plan_creation_maintains_the_rollup(db, make_user):
+    user = make_user("u@example.com")
+    plan = dict(title="W", scheduled_date=datetime(2025, 1, 6, 9), assigned_user_id=user.id,
+                exercises=[{"name": "Row", "sets": 4, "reps": 8, "weight": 50}])
+    crud.create_workout_plan(db, schemas.WorkoutPlanCreate(**plan))
+    crud.create_workout_plans_bulk(db, [schemas.WorkoutPlanCreate(**plan)] * 2)
+    row = rows(db, user.id)[("row", MONDAY)]
+    assert (row.sets, row.reps, row.tonnage, row.plans) == (12, 96, 4800.0, 3)
+
+def test_empty_deltas_write_nothing(db):
+    apply_volume_deltas(db, {})
+    db.commit()
+    assert db.query(models.TrainingVolume).count() == 0
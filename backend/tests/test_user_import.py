@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from user_import import CsvRowParser, ImportFormatError, NdjsonRowParser, ParsedRow, iter_lines
+
+def parse(parser, lines):
+    rows = [parser.feed(line) for line in lines]
+    rows.append(parser.close())
+    return [row for row in rows if row is not None]
+
+def test_rows_map_to_header_columns():
+    rows = parse(CsvRowParser(), ["Email,Full_Name,Password", "a@example.com,Ann,pw1", "", "b@example.com,Bo,pw2"])
+    assert rows == [
+        ParsedRow(2, {"email": "a@example.com", "full_name": "Ann", "password": "pw1"}),
+        ParsedRow(4, {"email": "b@example.com", "full_name": "Bo", "password": "pw2"}),
+    ]
+
+def test_quoted_field_spanning_lines_is_one_record():
+    rows = parse(CsvRowParser(), [
+        "email,full_name,password",
+        'a@example.com,"Ann',
+        'Second line, with a comma",pw1',
+        'b@example.com,"Bo ""The Coach""",pw2',
+    ])
+    assert rows == [
+        ParsedRow(2, {"email": "a@example.com", "full_name": "Ann\nSecond line, with a comma", "password": "pw1"}),
+        ParsedRow(4, {"email": "b@example.com", "full_name": 'Bo "The Coach"', "password": "pw2"}),
+    ]
+
+def test_wrong_field_count_reports_the_starting_line():
+    rows = parse(CsvRowParser(), ["email,full_name,password", '"a@example.com",Ann', "b@example.com,Bo,pw,extra"])
+    assert rows == [
+        ParsedRow(2, None, "expected 3 fields, got 2"),
+        ParsedRow(3, None, "expected 3 fields, got 4"),
+    ]
+
+def test_unterminated_quote_is_reported_at_close():
+    rows = parse(CsvRowParser(), ["email,full_name,password", 'a@example.com,"Ann,pw', "b@example.com,Bo,pw"])
+    assert rows == [ParsedRow(2, None, "unterminated quoted field")]
+
+def test_header_without_required_columns_fails_the_import():
+    with pytest.raises(ImportFormatError, match="full_name, password"):
+        CsvRowParser().feed("email,name")
+
+def test_ndjson_rows_and_errors():
+    rows = parse(NdjsonRowParser(), ['{"email": "a@example.com"}', "", "not json", "[1, 2]"])
+    assert rows == [
+        ParsedRow(1, {"email": "a@example.com"}),
+        ParsedRow(3, None, "invalid JSON"),
+        ParsedRow(4, None, "expected a JSON object"),
+    ]
+
+def test_iter_lines_handles_split_chunks_and_bom():
+    async def chunks():
+        for chunk in ("\ufeffemail,na".encode(), "me\r\nJosé".encode()[:-1], "é".encode()[-1:], b"\nlast"):
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(chunks())]
+
+    assert asyncio.run(collect()) == ["email,name", "José", "last"]
@@ -0,0 +1,102 @@
+"""
+Incremental training-volume rollups.
+
+Every workout plan write folds its exercises into weekly (user, exercise)
+buckets with one upsert, so progression charts read O(periods) rollup rows
+instead of rescanning every plan.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sqlalchemy import case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Optional, Tuple, Union
+
+import models
+
+VolumeKey = Tuple[int, str, date]
+
+@dataclass
+class VolumeDelta:
+    sets: int = 0
+    reps: int = 0
+    tonnage: float = 0.0
+    best_weight: float = 0.0
+    plans: int = 0
+
+def exercise_key(name: str) -> str:
+    return name.strip().lower()
+
+def week_start(scheduled_date: datetime) -> date:
+    day = scheduled_date.date()
+    return day - timedelta(days=day.weekday())
+
+def volume_deltas(
+    plans: Iterable[Tuple[int, Optional[datetime], Iterable]],
+    deltas: Optional[Dict[VolumeKey, VolumeDelta]] = None
+) -> Dict[VolumeKey, VolumeDelta]:
+    """
+    Fold (user_id, scheduled_date, exercises) plans into per-bucket deltas.
+
+    Exercises need name/sets/reps/weight attributes (schemas.Exercise or
+    models.WorkoutExercise). A plan counts once per exercise it contains.
+    Pass deltas to keep accumulating into an existing mapping.
+    """
+    if deltas is None:
+        deltas = {}
+    for user_id, scheduled_date, exercises in plans:
+        if scheduled_date is None:
+            continue
+        period_start = week_start(scheduled_date)
+        seen = set()
+        for exercise in exercises:
+            key = (user_id, exercise_key(exercise.name), period_start)
+            delta = deltas.setdefault(key, VolumeDelta())
+            delta.sets += exercise.sets
+            delta.reps += exercise.sets * exercise.reps
+            delta.tonnage += exercise.sets * exercise.reps * exercise.weight
+            delta.best_weight = max(delta.best_weight, exercise.weight)
+            if key not in seen:
+                seen.add(key)
+                delta.plans += 1
+    return deltas
+
+def _upsert_statement(dialect_name: str):
+    table = models.TrainingVolume.__table__
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    statement = dialect_insert(table)
+    excluded = statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.exercise, table.c.period_start],
+        set_={
+            "sets": table.c.sets + excluded.sets,
+            "reps": table.c.reps + excluded.reps,
+            "tonnage": table.c.tonnage + excluded.tonnage,
+            "best_weight": case(
+                (excluded.best_weight > table.c.best_weight, excluded.best_weight),
+                else_=table.c.best_weight
+            ),
+            "plans": table.c.plans + excluded.plans,
+        }
+    )
+
+def apply_volume_deltas(db: Union[Session, Connection], deltas: Dict[VolumeKey, VolumeDelta]) -> None:
+    """Upsert the deltas in one executemany; call inside the plan's write transaction"""
+    if not deltas:
+        return
+    rows = [
+        {
+            "user_id": user_id,
+            "exercise": exercise,
+            "period_start": period_start,
+            "sets": delta.sets,
+            "reps": delta.reps,
+            "tonnage": delta.tonnage,
+            "best_weight": delta.best_weight,
+            "plans": delta.plans,
+        }
+        for (user_id, exercise, period_start), delta in deltas.items()
+    ]
+    bind = db.get_bind() if isinstance(db, Session) else db
+    db.execute(_upsert_statement(bind.dialect.name), rows)
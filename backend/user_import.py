@@ -0,0 +1,237 @@
+"""
+Streaming client import from CSV or NDJSON.
+
+Rows are parsed as the upload arrives, passwords are hashed across the
+hashing executor a batch at a time, and each batch of users and their
+admin assignments is written in one transaction. Bad rows are reported
+with their line numbers instead of failing the import.
+"""
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncIterable, AsyncIterator, List, NamedTuple, Optional, Set, Tuple
+import codecs
+import csv
+import json
+import logging
+import os
+
+from identity_cache import identity_cache
+import crud
+import hashing
+import schemas
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "100"))
+# Errors beyond this many are counted but not listed in the report
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", "1000"))
+
+IMPORT_FORMATS = ("csv", "ndjson")
+REQUIRED_COLUMNS = ("email", "full_name", "password")
+
+class ImportFormatError(ValueError):
+    """The upload as a whole cannot be read, e.g. a CSV header without the required columns"""
+
+class ParsedRow(NamedTuple):
+    line: int
+    fields: Optional[dict]
+    error: Optional[str] = None
+
+class CsvRowParser:
+    """Incremental CSV parser fed one line at a time; the first record is the header"""
+
+    def __init__(self):
+        self.line = 0
+        self._header: Optional[List[str]] = None
+        self._pending: List[str] = []
+        self._start = 0
+        self._quotes = 0
+
+    def feed(self, line: str) -> Optional[ParsedRow]:
+        self.line += 1
+        if not self._pending:
+            if not line.strip():
+                return None
+            self._start = self.line
+        self._pending.append(line)
+        # Quotes inside fields are doubled, so an odd count means a quoted
+        # field (and the record) continues on the next line
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None
+
+        values = next(csv.reader(["\n".join(self._pending)]))
+        self._pending = []
+        self._quotes = 0
+        if self._header is None:
+            self._header = [name.strip().lower() for name in values]
+            missing = [column for column in REQUIRED_COLUMNS if column not in self._header]
+            if missing:
+                raise ImportFormatError(f"CSV header is missing columns: {', '.join(missing)}")
+            return None
+        if len(values) != len(self._header):
+            return ParsedRow(self._start, None, f"expected {len(self._header)} fields, got {len(values)}")
+        return ParsedRow(self._start, dict(zip(self._header, values)))
+
+    def close(self) -> Optional[ParsedRow]:
+        if self._pending:
+            return ParsedRow(self._start, None, "unterminated quoted field")
+        return None
+
+class NdjsonRowParser:
+    """One JSON object per line"""
+
+    def __init__(self):
+        self.line = 0
+
+    def feed(self, line: str) -> Optional[ParsedRow]:
+        self.line += 1
+        if not line.strip():
+            return None
+        try:
+            fields = json.loads(line)
+        except ValueError:
+            return ParsedRow(self.line, None, "invalid JSON")
+        if not isinstance(fields, dict):
+            return ParsedRow(self.line, None, "expected a JSON object")
+        return ParsedRow(self.line, fields)
+
+    def close(self) -> Optional[ParsedRow]:
+        return None
+
+def row_parser(import_format: str):
+    return CsvRowParser() if import_format == "csv" else NdjsonRowParser()
+
+def format_from_content_type(content_type: str) -> Optional[str]:
+    media_type = content_type.split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return "csv"
+    if media_type in ("application/x-ndjson", "application/ndjson", "application/jsonl", "application/jsonlines"):
+        return "ndjson"
+    return None
+
+def format_from_filename(filename: str) -> Optional[str]:
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        return "csv"
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return None
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Decode a UTF-8 byte stream (with or without a BOM) into lines as the bytes arrive"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+    )
+
+class UserImporter:
+    """
+    Accumulates parsed rows into batches and writes each batch on its own.
+
+    The optional admin gets every created user assigned; it needs id and
+    email attributes (a UserSnapshot or a models.User).
+    """
+
+    def __init__(self, db: AsyncSession, admin=None, batch_size: int = IMPORT_BATCH_SIZE):
+        self.db = db
+        self.admin = admin
+        self.batch_size = batch_size
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors: List[dict] = []
+        self._batch: List[Tuple[int, schemas.UserImportRow]] = []
+        self._seen: Set[str] = set()
+
+    def _error(self, line: int, error: str, email: Optional[str] = None) -> None:
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "email": email, "error": error})
+
+    async def add(self, row: ParsedRow) -> None:
+        self.rows += 1
+        if row.error is not None:
+            self._error(row.line, row.error)
+            return
+        email = row.fields.get("email")
+        try:
+            user = schemas.UserImportRow(**row.fields)
+        except ValidationError as e:
+            self._error(row.line, _describe(e), email if isinstance(email, str) else None)
+            return
+        if user.email in self._seen:
+            self._error(row.line, "duplicate email in import", user.email)
+            return
+        self._seen.add(user.email)
+        self._batch.append((row.line, user))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        registered = await crud.get_existing_emails_async(self.db, [user.email for _, user in batch])
+        new = []
+        for line, user in batch:
+            if user.email in registered:
+                self._error(line, "email already registered", user.email)
+            else:
+                new.append((line, user))
+        if not new:
+            return
+
+        hashes = await hashing.hash_passwords_async([user.password for _, user in new])
+        try:
+            created = await crud.create_users_bulk_async(
+                self.db,
+                [(user, hashed_password) for (_, user), hashed_password in zip(new, hashes)],
+                admin_id=self.admin.id if self.admin is not None else None
+            )
+        except Exception:
+            logger.exception(f"Import batch of {len(new)} users failed")
+            for line, user in new:
+                self._error(line, "could not be saved", user.email)
+            return
+        for line, user in new:
+            if user.email not in created:
+                self._error(line, "email already registered", user.email)
+        self.created += len(created)
+
+    async def run(self, lines: AsyncIterable[str], import_format: str) -> dict:
+        """Import every row of the stream and return the report"""
+        parser = row_parser(import_format)
+        aborted = None
+        try:
+            async for line in lines:
+                row = parser.feed(line)
+                if row is not None:
+                    await self.add(row)
+            row = parser.close()
+            if row is not None:
+                await self.add(row)
+        except (ImportFormatError, UnicodeDecodeError) as e:
+            aborted = f"line {parser.line + 1}: {e}" if isinstance(e, UnicodeDecodeError) else str(e)
+        await self.flush()
+        if self.admin is not None and self.created:
+            identity_cache.invalidate(self.admin.email)
+        logger.info(f"Imported {self.created} of {self.rows} users ({self.failed} failed)")
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "failed": self.failed,
+            "errors": sorted(self.errors, key=lambda error: error["line"]),
+            "aborted": aborted,
+        }
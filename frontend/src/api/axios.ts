@@ -118,4 +118,16 @@ axiosInstance.interceptors.response.use(
     }
 );
 
+// List endpoints return one page at a time; follow X-Next-Cursor to the end
+export const getAllPages = async <T>(url: string, params: Record<string, string> = {}): Promise<T[]> => {
+    const items: T[] = [];
+    let cursor: string | undefined;
+    do {
+        const response = await axiosInstance.get<T[]>(url, { params: cursor ? { ...params, cursor } : params });
+        items.push(...response.data);
+        cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return items;
+};
+
 export default axiosInstance; 
\ No newline at end of file
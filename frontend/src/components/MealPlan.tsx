@@ -1,7 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
-import api from '../api/axios';
+import { getAllPages } from '../api/axios';
 import Calendar from 'react-calendar';
+import { getCalendarWindow, startOfMonth } from '../utils/calendarWindow';
 import '../styles/calendar.css';
 
 interface Meal {
@@ -15,17 +16,19 @@ interface Meal {
 }
 
 interface MealPlan {
-  id: number;
+  id: number | null; // null for an occurrence of a recurring template
   title: string;
   description: string;
   scheduled_date: string;
   meals: Meal[];
   user_id: number;
   created_at?: string;
+  template_id?: number | null;
 }
 
 const MealPlan: React.FC = () => {
   const [selectedDate, setSelectedDate] = useState(new Date());
+  const [activeStartDate, setActiveStartDate] = useState(() => startOfMonth(new Date()));
   const [mealPlans, setMealPlans] = useState<MealPlan[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
@@ -34,9 +37,10 @@ const MealPlan: React.FC = () => {
   useEffect(() => {
     const fetchMealPlans = async () => {
       try {
-        const response = await api.get('/meal-plans/user');
-        console.log('Fetched meal plans:', response.data);
-        setMealPlans(response.data);
+        // Only fetch the plans visible in the current month view
+        const plans = await getAllPages<MealPlan>('/meal-plans/user', getCalendarWindow(activeStartDate));
+        console.log('Fetched meal plans:', plans);
+        setMealPlans(plans);
         setLoading(false);
       } catch (err) {
         console.error('Error fetching meal plans:', err);
@@ -46,7 +50,7 @@ const MealPlan: React.FC = () => {
     };
 
     fetchMealPlans();
-  }, []);
+  }, [activeStartDate]);
 
   const getMealPlansForDate = (date: Date) => {
     if (!mealPlans) return [];
@@ -107,6 +111,9 @@ const MealPlan: React.FC = () => {
             <div>
               <Calendar
                 onChange={(value) => setSelectedDate(value as Date)}
+                onActiveStartDateChange={({ activeStartDate }) => {
+                  if (activeStartDate) setActiveStartDate(startOfMonth(activeStartDate));
+                }}
                 value={selectedDate}
                 tileContent={tileContent}
                 className="miami-calendar w-full rounded-xl border-none bg-[#2a2a4e] text-white"
@@ -123,7 +130,7 @@ const MealPlan: React.FC = () => {
               ) : selectedMealPlans.length > 0 ? (
                 <div className="space-y-4">
                   {selectedMealPlans.map((plan) => (
-                    <div key={plan.id} className="miami-card p-6">
+                    <div key={plan.id ?? `template-${plan.template_id}-${plan.scheduled_date}`} className="miami-card p-6">
                       <h3 className="text-xl font-semibold text-white mb-2">
                         {plan.title}
                       </h3>
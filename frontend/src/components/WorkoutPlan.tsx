@@ -1,7 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
-import api from '../api/axios';
+import { getAllPages } from '../api/axios';
 import Calendar from 'react-calendar';
+import { getCalendarWindow, startOfMonth } from '../utils/calendarWindow';
 import '../styles/calendar.css';
 import {
   Container,
@@ -24,17 +25,19 @@ interface Exercise {
 }
 
 interface WorkoutPlan {
-  id: number;
+  id: number | null; // null for an occurrence of a recurring template
   title: string;
   description: string;
   scheduled_date: string;
   exercises: Exercise[];
   assigned_user_id: number;
   created_at?: string;
+  template_id?: number | null;
 }
 
 const WorkoutPlan: React.FC = () => {
   const [selectedDate, setSelectedDate] = useState(new Date());
+  const [activeStartDate, setActiveStartDate] = useState(() => startOfMonth(new Date()));
   const [workoutPlans, setWorkoutPlans] = useState<WorkoutPlan[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
@@ -43,9 +46,10 @@ const WorkoutPlan: React.FC = () => {
   useEffect(() => {
     const fetchWorkoutPlans = async () => {
       try {
-        const response = await api.get('/workout-plans/user');
-        console.log('Fetched workout plans:', response.data);
-        setWorkoutPlans(response.data);
+        // Only fetch the plans visible in the current month view
+        const plans = await getAllPages<WorkoutPlan>('/workout-plans/user', getCalendarWindow(activeStartDate));
+        console.log('Fetched workout plans:', plans);
+        setWorkoutPlans(plans);
         setLoading(false);
       } catch (err) {
         console.error('Error fetching workout plans:', err);
@@ -55,7 +59,7 @@ const WorkoutPlan: React.FC = () => {
     };
 
     fetchWorkoutPlans();
-  }, []);
+  }, [activeStartDate]);
 
   const getWorkoutsForDate = (date: Date) => {
     return workoutPlans.filter(plan => {
@@ -138,6 +142,9 @@ const WorkoutPlan: React.FC = () => {
             <div>
               <Calendar
                 onChange={(value) => setSelectedDate(value as Date)}
+                onActiveStartDateChange={({ activeStartDate }) => {
+                  if (activeStartDate) setActiveStartDate(startOfMonth(activeStartDate));
+                }}
                 value={selectedDate}
                 tileContent={tileContent}
                 className="miami-calendar w-full rounded-xl border-none bg-[#2a2a4e] text-white"
@@ -154,7 +161,7 @@ const WorkoutPlan: React.FC = () => {
               ) : selectedWorkouts.length > 0 ? (
                 <div className="space-y-4">
                   {selectedWorkouts.map((workout) => (
-                    <div key={workout.id} className="miami-card p-6">
+                    <div key={workout.id ?? `template-${workout.template_id}-${workout.scheduled_date}`} className="miami-card p-6">
                       <h3 className="text-xl font-semibold text-white mb-2">
                         {workout.title}
                       </h3>
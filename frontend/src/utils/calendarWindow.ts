@@ -0,0 +1,13 @@
+// A month view also shows trailing days of the previous month and leading
+// days of the next one, so pad the window to cover the whole visible grid.
+const LEADING_DAYS = 7;
+const TRAILING_DAYS = 14;
+
+export const startOfMonth = (date: Date): Date =>
+  new Date(date.getFullYear(), date.getMonth(), 1);
+
+export const getCalendarWindow = (monthStart: Date): { from: string; to: string } => {
+  const from = new Date(monthStart.getFullYear(), monthStart.getMonth(), 1 - LEADING_DAYS);
+  const to = new Date(monthStart.getFullYear(), monthStart.getMonth() + 1, 1 + TRAILING_DAYS);
+  return { from: from.toISOString(), to: to.toISOString() };
+};